@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def measure(function, repeat):
+    """
+    Time a function and track its peak memory allocation.
+    :param function: The function to measure. It is called without arguments.
+    :param repeat: The number of times the function is called.
+    :return: Dictionary with the timings in seconds and the peak memory in bytes, or the error that was raised.
+    """
+    timings = []
+    peak_memory = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = perf_counter()
+        try:
+            function()
+        except Exception as e:
+            tracemalloc.stop()
+            return {"error": f"{type(e).__name__}: {e}"}
+        timings.append(perf_counter() - start)
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {"mean_s": statistics.fmean(timings), "min_s": min(timings), "max_s": max(timings),
+            "peak_memory_bytes": peak_memory}
+
+
+def measure_functions(functions, repeat, warm_up):
+    """
+    Measure several functions.
+    :param functions: Dictionary of names and functions.
+    :param repeat: The number of times each function is measured.
+    :param warm_up: Whether each function is called once before it is measured, e.g., to fill the cache.
+    :return: Dictionary of names and measurements, see measure.
+    """
+    results = {}
+    for name, function in functions.items():
+        if warm_up:
+            try:
+                function()
+            except Exception:
+                pass
+        results[name] = measure(function, repeat)
+    return results
+
+
+def run_benchmark(args):
+    """
+    Run the dashboard benchmark on a measurement tree.
+    :param args: The parsed command line arguments.
+    :return: Dictionary with the configuration and results of the benchmark.
+    """
+    original_directory = os.getcwd()
+    os.chdir(args.data)
+    try:
+        import monitoring_interface as mi
+
+        settings = mi.get_monitor_settings()
+        cost = (settings["cost_per_kwh"], settings["currency"], settings["gco2e_per_kwh"],
+                settings["gco2e_per_kilometer_car"])
+
+        plug = Path(args.plug) if args.plug is not None else sorted(
+            item for item in Path("./measurements").iterdir() if item.is_dir())[0]
+        experiments = [item for item in sorted(plug.iterdir()) if item.is_dir()]
+        # Selecting "All" files of every experiment of the plug in the file dropdown.
+        files = "".join(f"!{experiment}" for experiment in experiments)
+        readings = sum(1 for experiment in experiments for _ in experiment.iterdir())
+
+        scatter_data = mi.make_scatters(mi.get_experiment_files(files), args.smoothness, True)
+
+        functions = {
+            "get_experiment_files": lambda: mi.get_experiment_files(files),
+            "make_scatters": lambda: mi.make_scatters(mi.get_experiment_files(files), args.smoothness, True),
+            "make_graph": lambda: mi.make_graph(files, *cost, args.smoothness, ["ON"], True),
+            "calculate_information": lambda: mi.calculate_information(
+                scatter_data["total_power"], scatter_data["power_by_experiment"], *cost),
+        }
+        if not args.skip_exports:
+            functions["export_selected_experiments"] = lambda: mi.export_selected_experiments(
+                1, files, *cost, args.smoothness, ["ON"])
+            functions["export_all_experiments"] = lambda: mi.export_all_experiments(1, *cost, args.smoothness)
+
+        # The disk cache persists between repeats and runs, so the results are measured without it, and with a fresh,
+        # warmed up cache only on request.
+        cache_enabled = mi.cache.enabled
+        mi.cache.enabled = False
+        results = measure_functions(functions, args.repeat, False)
+        warm_cache_results = None
+        if args.warm_cache:
+            cache_folder = mi.cache.folder
+            with tempfile.TemporaryDirectory() as temporary_folder:
+                mi.cache.folder = Path(temporary_folder)
+                mi.cache.enabled = True
+                warm_cache_results = measure_functions(functions, args.repeat, True)
+            mi.cache.folder = cache_folder
+        mi.cache.enabled = cache_enabled
+    finally:
+        os.chdir(original_directory)
+
+    return {
+        "benchmark": "dashboard",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "dataset": {"plug": str(plug), "experiments": len(experiments), "files": readings},
+        "results": results,
+        "warm_cache_results": warm_cache_results
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the EMERS monitoring interface on a measurement tree.')
+    parser.add_argument('--data', type=str, required=True)
+    parser.add_argument('--plug', type=str, required=False, default=None)
+    parser.add_argument('--smoothness', type=int, required=False, default=100)
+    parser.add_argument('--repeat', type=int, required=False, default=3)
+    parser.add_argument('--skip_exports', action='store_true')
+    parser.add_argument('--warm_cache', action='store_true')
+    parser.add_argument('--output', type=str, required=False, default=None)
+    args = parser.parse_args()
+
+    benchmark_result = json.dumps(run_benchmark(args), indent=2)
+
+    if args.output is None:
+        print(benchmark_result)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(benchmark_result)
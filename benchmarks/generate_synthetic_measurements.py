@@ -0,0 +1,128 @@
+import argparse
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from log_rotation import segment_name
+
+
+def generate_segment(rng, start_timestamp, samples, polling_rate, power_state, total_draw):
+    """
+    Generate one log file segment of synthetic smart plug readings.
+    :param rng: The NumPy random generator.
+    :param start_timestamp: The timestamp of the first reading of the segment.
+    :param samples: The number of readings in the segment.
+    :param polling_rate: The mean time between two readings in seconds.
+    :param power_state: Dictionary with the "idle" and "load" draw of the simulated machine in W.
+    :param total_draw: The total draw of the plug in kWh at the start of the segment.
+    :return: Tuple of (DataFrame with the readings, total draw at the end of the segment).
+    """
+    # Polling is not perfectly periodic, so the time between readings is jittered around the polling rate.
+    intervals = polling_rate + rng.normal(0, polling_rate * 0.05, samples).clip(-polling_rate / 2, polling_rate / 2)
+    timestamps = start_timestamp + np.cumsum(intervals) - intervals[0]
+
+    # Training load alternates between busy phases and idle phases of a few minutes each.
+    phase_length = max(int(rng.integers(120, 600) / polling_rate), 1)
+    busy = (np.arange(samples) // phase_length + int(rng.integers(0, 2))) % 2 == 0
+    current_draw = np.where(busy, power_state["load"], power_state["idle"]) + rng.normal(0, 8, samples)
+    current_draw = current_draw.clip(0).round(1)
+
+    energy = np.cumsum(current_draw * intervals) / 3600 / 1000
+    total_draw_readings = (total_draw + energy).round(6)
+
+    readings = pd.DataFrame({"timestamp": timestamps, "current_draw": current_draw,
+                             "total_draw": total_draw_readings})
+
+    return readings, float(total_draw_readings[-1])
+
+
+def generate_experiment(rng, experiment_folder, start_timestamp, duration, polling_rate, log_interval, power_state,
+                        total_draw):
+    """
+    Generate all log file segments of one experiment.
+    :param rng: The NumPy random generator.
+    :param experiment_folder: The folder to write the log files to.
+    :param start_timestamp: The timestamp at which the experiment started.
+    :param duration: The duration of the experiment in seconds.
+    :param polling_rate: The mean time between two readings in seconds.
+    :param log_interval: The interval at which the log file is rotated in seconds.
+    :param power_state: Dictionary with the "idle" and "load" draw of the simulated machine in W.
+    :param total_draw: The total draw of the plug in kWh at the start of the experiment.
+    :return: Tuple of (number of written readings, total draw at the end of the experiment).
+    """
+    experiment_folder.mkdir(exist_ok=True, parents=True)
+
+    written = 0
+    sequence = 0
+    segment_start = start_timestamp
+    while segment_start < start_timestamp + duration:
+        segment_duration = min(log_interval, start_timestamp + duration - segment_start)
+        samples = max(int(segment_duration / polling_rate), 1)
+        readings, total_draw = generate_segment(rng, segment_start, samples, polling_rate, power_state, total_draw)
+        readings.to_csv(experiment_folder / segment_name(int(segment_start), sequence, True), index=False)
+        written += samples
+        sequence += 1
+        segment_start += log_interval
+
+    return written, total_draw
+
+
+def generate_measurements(output, plugs, experiments, days, polling_rate, log_interval, seed):
+    """
+    Generate a synthetic measurement tree in the layout written by MeasurementManager.
+    :param output: The folder in which the "measurements" folder is created.
+    :param plugs: The number of smart plugs.
+    :param experiments: The number of experiments per smart plug.
+    :param days: The total duration of the experiments of one smart plug in days.
+    :param polling_rate: The mean time between two readings in seconds.
+    :param log_interval: The interval at which the log files are rotated in seconds.
+    :param seed: The seed of the random generator.
+    :return: Dictionary with statistics about the generated data.
+    """
+    rng = np.random.default_rng(seed)
+    output = Path(output)
+    measurements = output / "measurements"
+
+    # The monitoring interface reads its settings from the working directory.
+    shutil.copy(Path(__file__).resolve().parent.parent / "monitor_settings.json", output / "monitor_settings.json")
+
+    experiment_duration = days * 24 * 3600 / experiments
+    start_timestamp = 1720000000.0
+
+    statistics = {"plugs": plugs, "experiments": plugs * experiments, "segments": 0, "readings": 0}
+    for plug in range(plugs):
+        power_state = {"idle": float(rng.uniform(40, 120)), "load": float(rng.uniform(200, 450))}
+        total_draw = float(rng.uniform(0, 100))
+        for experiment in range(experiments):
+            written, total_draw = generate_experiment(
+                rng, measurements / f"SyntheticPlug{plug}" / f"SyntheticExperiment{experiment}",
+                start_timestamp + experiment * experiment_duration, experiment_duration, polling_rate, log_interval,
+                power_state, total_draw)
+            statistics["readings"] += written
+            statistics["segments"] += int(np.ceil(experiment_duration / log_interval))
+
+    statistics["bytes"] = sum(file.stat().st_size for file in measurements.rglob("*") if file.is_file())
+
+    return statistics
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic EMERS measurement tree.')
+    parser.add_argument('--output', type=str, required=True)
+    parser.add_argument('--plugs', type=int, required=False, default=2)
+    parser.add_argument('--experiments', type=int, required=False, default=4)
+    parser.add_argument('--days', type=float, required=False, default=1)
+    parser.add_argument('--polling_rate', type=float, required=False, default=0.5)
+    parser.add_argument('--log_interval', type=int, required=False, default=300)
+    parser.add_argument('--seed', type=int, required=False, default=0)
+    args = parser.parse_args()
+
+    Path(args.output).mkdir(exist_ok=True, parents=True)
+    print(json.dumps(generate_measurements(args.output, args.plugs, args.experiments, args.days, args.polling_rate,
+                                           args.log_interval, args.seed), indent=2))
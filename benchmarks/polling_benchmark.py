@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+from contextlib import ExitStack
+from pathlib import Path
+from time import time, sleep
+
+repository = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repository))
+
+from log_rotation import is_log_file
+from measurement_manager import MeasurementManager
+
+
+def get_resource_usage():
+    """
+    Get the CPU time and resident set size of the current process.
+    :return: Tuple of (user + system CPU seconds, RSS in bytes or None if it cannot be determined).
+    """
+    cpu_times = os.times()
+    cpu_seconds = cpu_times.user + cpu_times.system
+
+    try:
+        import psutil
+        rss = psutil.Process().memory_info().rss
+    except ImportError:
+        try:
+            import resource
+            # ru_maxrss is the peak RSS, reported in kilobytes on Linux and bytes on macOS.
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            rss = rss if sys.platform == "darwin" else rss * 1024
+        except ImportError:
+            rss = None
+
+    return cpu_seconds, rss
+
+
+def make_simulated_devices(args):
+    """
+    Create the settings entries for the simulated devices.
+    :param args: The parsed command line arguments.
+    :return: Dictionary in the format of settings.json.
+    """
+    if args.meter == "replay":
+        # Virtual plugs start at different points of the recording, so that they are not in sync.
+        return {f"ReplayPlug{i}": {
+            "device_type": "replay",
+            "device_ip": f"replay-{i}",
+            "replay_path": str(Path(args.replay_path).resolve()),
+            "speedup": args.speedup,
+            "replay_offset": i * 7,
+            "latency_mean": args.latency_mean
+        } for i in range(args.devices)}
+
+    return {f"SimulatedPlug{i}": {
+        "device_type": "simulated",
+        "device_ip": f"simulated-{i}",
+        "latency_distribution": args.latency_distribution,
+        "latency_mean": args.latency_mean,
+        "latency_jitter": args.latency_jitter,
+        "failure_rate": args.failure_rate
+    } for i in range(args.devices)}
+
+
+def is_polling(manager):
+    """
+    Check whether the polling loop of a MeasurementManager is still running.
+    :param manager: The MeasurementManager.
+    :return: True if the polling thread or process is alive.
+    """
+    if manager.poller_process is not None:
+        return manager.poller_process.process.poll() is None
+    return manager.loop_thread is not None and manager.loop_thread.is_alive()
+
+
+def read_timestamps(log_folder):
+    """
+    Read the logged timestamps and the number of written bytes of one device.
+    :param log_folder: The folder that contains the log files of the device.
+    :return: Tuple of (sorted list of timestamps, number of gap markers, total number of bytes written).
+    """
+    timestamps = []
+    gaps = 0
+    bytes_written = 0
+    for log_file in log_folder.iterdir():
+        if not is_log_file(log_file):
+            continue
+        bytes_written += log_file.stat().st_size
+        with open(log_file, "r") as file:
+            next(file, None)
+            for line in file:
+                timestamp, current_draw = line.split(",")[:2]
+                if not current_draw:
+                    gaps += 1
+                elif timestamp:
+                    timestamps.append(float(timestamp))
+
+    return sorted(timestamps), gaps, bytes_written
+
+
+def evaluate_device(device_name, experiment_name, polling_rate, duration):
+    """
+    Compute the timing metrics of one device from its log files.
+    :param device_name: The name of the simulated device.
+    :param experiment_name: The name of the benchmark experiment.
+    :param polling_rate: The configured polling rate in seconds.
+    :param duration: The wall clock duration of the benchmark in seconds.
+    :return: Dictionary with the metrics of the device.
+    """
+    timestamps, gaps, bytes_written = read_timestamps(Path(f"./measurements/{device_name}/{experiment_name}"))
+    samples = len(timestamps)
+    intervals = [b - a for a, b in zip(timestamps, timestamps[1:])]
+
+    metrics = {
+        "device": device_name,
+        "samples": samples,
+        "gaps": gaps,
+        "sample_rate_hz": samples / duration,
+        "target_sample_rate_hz": 1 / polling_rate,
+        "bytes_written": bytes_written,
+        "bytes_per_sample": bytes_written / samples if samples else None,
+        "mean_interval_s": statistics.fmean(intervals) if intervals else None,
+        "jitter_s": statistics.pstdev(intervals) if len(intervals) > 1 else None,
+        "max_interval_s": max(intervals) if intervals else None,
+        # Drift is how far the last sample lags behind an ideal schedule that started at the first sample.
+        "drift_s": timestamps[-1] - (timestamps[0] + (samples - 1) * polling_rate) if samples else None,
+    }
+    metrics["drift_per_sample_s"] = metrics["drift_s"] / (samples - 1) if samples > 1 else None
+
+    return metrics
+
+
+def run_benchmark(args):
+    """
+    Run the polling benchmark in a temporary working directory.
+    :param args: The parsed command line arguments.
+    :return: Dictionary with the configuration and results of the benchmark.
+    """
+    devices = make_simulated_devices(args)
+    experiment_name = "benchmark"
+    original_directory = os.getcwd()
+
+    with tempfile.TemporaryDirectory(prefix="emers_benchmark_") as working_directory:
+        os.chdir(working_directory)
+        try:
+            with open("settings.json", "w") as file:
+                json.dump(devices, file, indent=2)
+
+            cpu_start, rss_start = get_resource_usage()
+            children_start = os.times().children_user + os.times().children_system
+            wall_start = time()
+
+            with ExitStack() as stack:
+                managers = [stack.enter_context(MeasurementManager(device_name=device_name,
+                                                                   experiment_name=experiment_name,
+                                                                   polling_rate=args.polling_rate,
+                                                                   log_interval=args.log_interval,
+                                                                   poller=args.poller))
+                            for device_name in devices]
+                sleep(args.duration)
+                stopped_devices = [manager.device_name for manager in managers if not is_polling(manager)]
+
+            duration = time() - wall_start
+            cpu_end, rss_end = get_resource_usage()
+            children_end = os.times().children_user + os.times().children_system
+
+            device_results = [evaluate_device(device_name, experiment_name, args.polling_rate, duration)
+                              for device_name in devices]
+        finally:
+            os.chdir(original_directory)
+
+    total_samples = sum(result["samples"] for result in device_results)
+    total_bytes = sum(result["bytes_written"] for result in device_results)
+    jitters = [result["jitter_s"] for result in device_results if result["jitter_s"] is not None]
+    drifts = [result["drift_per_sample_s"] for result in device_results if result["drift_per_sample_s"] is not None]
+
+    return {
+        "benchmark": "polling",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "results": {
+            "duration_s": duration,
+            "total_samples": total_samples,
+            "total_gaps": sum(result["gaps"] for result in device_results),
+            "sample_rate_hz": total_samples / duration,
+            "sample_rate_per_device_hz": total_samples / duration / args.devices,
+            "target_sample_rate_per_device_hz": 1 / args.polling_rate,
+            "mean_jitter_s": statistics.fmean(jitters) if jitters else None,
+            "mean_drift_per_sample_s": statistics.fmean(drifts) if drifts else None,
+            "cpu_percent": (cpu_end - cpu_start) / duration * 100,
+            "poller_process_cpu_percent": (children_end - children_start) / duration * 100,
+            "rss_bytes": rss_end,
+            "rss_growth_bytes": rss_end - rss_start if rss_start is not None and rss_end is not None else None,
+            "bytes_per_sample": total_bytes / total_samples if total_samples else None,
+            "stopped_devices": stopped_devices,
+        },
+        "devices": device_results
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the EMERS polling engine with simulated or replayed '
+                                                 'meters.')
+    parser.add_argument('--devices', type=int, required=False, default=1)
+    parser.add_argument('--duration', type=float, required=False, default=10)
+    parser.add_argument('--polling_rate', type=float, required=False, default=0.5)
+    parser.add_argument('--log_interval', type=int, required=False, default=300)
+    parser.add_argument('--latency_distribution', type=str, required=False, default="constant",
+                        choices=["constant", "uniform", "normal", "lognormal"])
+    parser.add_argument('--latency_mean', type=float, required=False, default=0.05)
+    parser.add_argument('--latency_jitter', type=float, required=False, default=0)
+    parser.add_argument('--failure_rate', type=float, required=False, default=0)
+    parser.add_argument('--poller', type=str, required=False, default="thread", choices=["thread", "process"])
+    parser.add_argument('--meter', type=str, required=False, default="simulated", choices=["simulated", "replay"])
+    parser.add_argument('--replay_path', type=str, required=False,
+                        default=str(repository / "measurements/ExamplePlug/ExampleExperiment"))
+    parser.add_argument('--speedup', type=float, required=False, default=1)
+    parser.add_argument('--output', type=str, required=False, default=None)
+    args = parser.parse_args()
+
+    benchmark_result = json.dumps(run_benchmark(args), indent=2)
+
+    if args.output is None:
+        print(benchmark_result)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(benchmark_result)
@@ -0,0 +1,68 @@
+import argparse
+import json
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+from time import time, sleep
+
+repository = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repository))
+
+from measurement_manager import MeasurementManager
+
+
+def add_replay_devices(args):
+    """
+    Add virtual plugs that replay a recording to settings.json of the working directory. Other entries are kept.
+    :param args: The parsed command line arguments.
+    :return: The names of the virtual plugs.
+    """
+    try:
+        with open("settings.json", "r") as file:
+            devices = json.load(file)
+    except FileNotFoundError:
+        devices = {}
+
+    device_names = [f"ReplayPlug{i}" for i in range(args.devices)]
+    for i, device_name in enumerate(device_names):
+        devices[device_name] = {
+            "device_type": "replay",
+            "device_ip": f"replay-{i}",
+            "replay_path": str(Path(args.replay_path).resolve()),
+            "speedup": args.speedup,
+            "replay_offset": i * 7
+        }
+
+    with open("settings.json", "w") as file:
+        json.dump(devices, file, indent=2)
+
+    return device_names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recording on many virtual plugs in one process, e.g., to '
+                                                 'load test the live mode of the monitoring interface.')
+    parser.add_argument('--devices', type=int, required=False, default=4)
+    parser.add_argument('--duration', type=float, required=False, default=0)
+    parser.add_argument('--polling_rate', type=float, required=False, default=0.5)
+    parser.add_argument('--speedup', type=float, required=False, default=1)
+    parser.add_argument('--replay_path', type=str, required=False,
+                        default=str(repository / "measurements/ExamplePlug/ExampleExperiment"))
+    parser.add_argument('--experiment_name', type=str, required=False, default="replay")
+    parser.add_argument('--storage', type=str, required=False, default="csv", choices=["csv", "sqlite"])
+    parser.add_argument('--poller', type=str, required=False, default="thread", choices=["thread", "process"])
+    args = parser.parse_args()
+
+    replay_devices = add_replay_devices(args)
+    start = time()
+    try:
+        with ExitStack() as stack:
+            for replay_device in replay_devices:
+                stack.enter_context(MeasurementManager(device_name=replay_device,
+                                                       experiment_name=args.experiment_name,
+                                                       polling_rate=args.polling_rate, storage=args.storage,
+                                                       poller=args.poller))
+            while args.duration <= 0 or time() - start < args.duration:
+                sleep(0.1)
+    except KeyboardInterrupt:
+        print("Stopped replay with keyboard interrupt.")
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+repository = Path(__file__).resolve().parent.parent
+
+heavy_modules = ["numpy", "pandas", "plotly", "dash", "flask", "tapo", "requests"]
+
+first_sample = """
+from measurement_manager import MeasurementManager
+manager = MeasurementManager(device_name="MockPlug", experiment_name="startup", polling_rate=0.01,
+                             poller="{poller}")
+manager.__enter__()
+while manager.get_latest_result() is None:
+    time.sleep(0.001)
+manager.__exit__(None, None, None)
+"""
+
+scenarios = {
+    "interpreter": "pass",
+    "import_measurement_manager": "import measurement_manager",
+    "import_continuous_measurement": "import continuous_measurement",
+    "first_sample_thread_poller": first_sample.format(poller="thread"),
+    "first_sample_process_poller": first_sample.format(poller="process"),
+    "import_monitoring_interface": "import monitoring_interface",
+}
+
+child_template = """
+import time
+start = time.perf_counter()
+import json, sys
+sys.path.insert(0, {repository!r})
+{statement}
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                  "heavy_modules": [module for module in {heavy_modules!r} if module in sys.modules]}}))
+"""
+
+
+def run_scenario(statement, repeat):
+    """
+    Run a statement in fresh interpreters and time it.
+    :param statement: The Python code to run.
+    :param repeat: The number of fresh interpreters to run the statement in.
+    :return: Dictionary with the median wall time of the interpreter, the median time of the statement, and the
+    heavy modules that the statement loaded.
+    """
+    code = child_template.format(repository=str(repository), statement=statement, heavy_modules=heavy_modules)
+    wall_times = []
+    statement_times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        wall_times.append(perf_counter() - start)
+        if output.returncode != 0:
+            return {"error": output.stderr.strip().splitlines()[-1]}
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        statement_times.append(result["seconds"])
+
+    return {"median_process_s": statistics.median(wall_times), "median_statement_s": statistics.median(statement_times),
+            "heavy_modules": result["heavy_modules"]}
+
+
+def run_benchmark(args):
+    """
+    Run the startup benchmark in a temporary working directory with a mock device.
+    :param args: The parsed command line arguments.
+    :return: Dictionary with the configuration and results of the benchmark.
+    """
+    original_directory = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="emers_startup_") as working_directory:
+        os.chdir(working_directory)
+        try:
+            with open("settings.json", "w") as file:
+                json.dump({"MockPlug": {"device_type": "mock", "device_ip": "http://127.0.0.1/"}}, file)
+            with open(repository / "monitor_settings.json", "r") as source, open("monitor_settings.json", "w") as file:
+                file.write(source.read())
+
+            results = {name: run_scenario(statement, args.repeat) for name, statement in scenarios.items()}
+        finally:
+            os.chdir(original_directory)
+
+    return {
+        "benchmark": "startup",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "results": results
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the cold start of EMERS entry points.')
+    parser.add_argument('--repeat', type=int, required=False, default=5)
+    parser.add_argument('--output', type=str, required=False, default=None)
+    args = parser.parse_args()
+
+    benchmark_result = json.dumps(run_benchmark(args), indent=2)
+
+    if args.output is None:
+        print(benchmark_result)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(benchmark_result)
@@ -2,13 +2,22 @@ import asyncio
 import argparse
 
 from measurement_manager import MeasurementManager
+from polling_resilience import RetryPolicy
 
 
 async def main():
+    manager = MeasurementManager(device_name=args.device_name, experiment_name="continuous",
+                                 polling_rate=args.polling_rate, log_interval=args.log_interval,
+                                 metrics_port=args.metrics_port, summary_interval=args.summary_interval,
+                                 retry_policy=RetryPolicy(max_retries=args.max_retries,
+                                                          request_timeout=args.request_timeout),
+                                 max_log_bytes=args.max_log_bytes, storage=args.storage)
+    if args.capture_baseline is not None:
+        await manager.capture_baseline(args.capture_baseline)
+        return
+
     print(f"Running continuous measurement for {args.device_name} with "
           f"polling rate {args.polling_rate} and log interval {args.log_interval}...")
-    manager = MeasurementManager(device_name=args.device_name, experiment_name="continuous",
-                                 polling_rate=args.polling_rate, log_interval=args.log_interval)
     try:
         await manager.log_data()
     except KeyboardInterrupt:
@@ -20,6 +29,13 @@ if __name__ == '__main__':
     parser.add_argument('--device_name', type=str, required=True)
     parser.add_argument('--polling_rate', type=float, required=False, default=0.5)
     parser.add_argument('--log_interval', type=int, required=False, default=300)
+    parser.add_argument('--storage', type=str, required=False, default="csv", choices=["csv", "sqlite"])
+    parser.add_argument('--max_log_bytes', type=int, required=False, default=None)
+    parser.add_argument('--metrics_port', type=int, required=False, default=None)
+    parser.add_argument('--summary_interval', type=float, required=False, default=None)
+    parser.add_argument('--max_retries', type=int, required=False, default=3)
+    parser.add_argument('--request_timeout', type=float, required=False, default=5.0)
+    parser.add_argument('--capture_baseline', type=float, required=False, default=None)
     args = parser.parse_args()
 
     asyncio.run(main())
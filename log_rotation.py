@@ -0,0 +1,283 @@
+import csv
+import math
+import re
+import sys
+from pathlib import Path
+
+log_header = ['timestamp', 'current_draw', 'total_draw']
+
+# Closed log files can be compressed to archives, see measurement_archive.py.
+archive_suffix = ".emz"
+
+# Segments are named "<window start>_<sequence>.csv" when closed and "<window start>_<sequence>.open.csv" while
+# they are written to. Closed segments never change again, except for being archived to "<window start>_<sequence>.emz".
+segment_name_pattern = re.compile(
+    r"^(?P<window_start>\d+)_(?P<sequence>\d{6})(?:(?P<open>\.open)?\.csv|\.emz)$")
+
+
+class RotationPolicy:
+    """
+    Class to decide when a log file is rotated, based on wall clock aligned time windows and the file size.
+    """
+
+    def __init__(self, interval=300, max_bytes=None, align=True):
+        """
+        Initialize the RotationPolicy.
+        :param interval: The length of a time window in seconds.
+        :param max_bytes: The size in bytes after which a log file is rotated within a time window, or None.
+        :param align: Whether time windows are aligned to the wall clock, e.g., every 5 minutes on the minute.
+        Otherwise, time windows are aligned to the start of the measurement.
+        """
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.align = align
+        self.origin = 0
+
+    def window_start(self, timestamp):
+        """
+        Get the start of the time window that contains a timestamp.
+        :param timestamp: The timestamp in seconds.
+        :return: The start of the time window in whole seconds.
+        """
+        return int(self.origin + math.floor((timestamp - self.origin) / self.interval) * self.interval)
+
+    def start(self, timestamp):
+        """
+        Set the origin of the time windows if they are not aligned to the wall clock.
+        :param timestamp: The timestamp at which the measurement starts.
+        """
+        if not self.align:
+            self.origin = timestamp
+
+    def should_rotate(self, window_start, size, timestamp):
+        """
+        Check whether the current log file must be rotated before writing.
+        :param window_start: The start of the time window of the current log file.
+        :param size: The size of the current log file in bytes.
+        :param timestamp: The timestamp of the row that will be written.
+        :return: True if the log file must be rotated.
+        """
+        if self.window_start(timestamp) != window_start:
+            return True
+        return self.max_bytes is not None and size >= self.max_bytes
+
+
+def segment_name(window_start, sequence, closed):
+    """
+    Get the file name of a segment.
+    :param window_start: The start of the time window of the segment in whole seconds.
+    :param sequence: The sequence number of the segment within its folder.
+    :param closed: Whether the segment is closed.
+    :return: The file name.
+    """
+    return f"{window_start}_{sequence:06d}{'' if closed else '.open'}.csv"
+
+
+def parse_segment_name(path):
+    """
+    Parse the file name of a segment without opening it.
+    :param path: The path of the segment.
+    :return: Dictionary with "window_start", "sequence", and "closed", or None if the file is not a named segment.
+    """
+    match = segment_name_pattern.match(Path(path).name)
+    if match is None:
+        return None
+
+    return {"window_start": int(match["window_start"]), "sequence": int(match["sequence"]),
+            "closed": match["open"] is None}
+
+
+def is_log_file(path):
+    """
+    Check whether a file in an experiment folder is a log file with readings, as opposed to, e.g., phase markers.
+    Archived log files are log files as well.
+    :param path: The path of the file.
+    :return: True if the file is a log file.
+    """
+    path = Path(path)
+    return path.suffix in [".csv", archive_suffix] and path.is_file()
+
+
+def is_closed_segment(path):
+    """
+    Check whether a log file will not be written to anymore. Log files from before segment naming count as closed.
+    :param path: The path of the log file.
+    :return: True if the log file is closed.
+    """
+    segment = parse_segment_name(path)
+    return segment is None or segment["closed"]
+
+
+def lock_path(window_start, sequence, folder):
+    """
+    Get the path of the lock file of a segment. The writer of an open segment holds a lock on it, so that open segments
+    of live writers can be told apart from open segments left behind by an interrupted measurement.
+    :param window_start: The start of the time window of the segment in whole seconds.
+    :param sequence: The sequence number of the segment within its folder.
+    :param folder: The folder of the segment.
+    :return: The path of the lock file.
+    """
+    return Path(folder) / f"{window_start}_{sequence:06d}.lock"
+
+
+def try_lock(path):
+    """
+    Try to lock a lock file without waiting. The lock is released when the returned file is closed, also if the
+    process is killed.
+    :param path: The path of the lock file. It is created if it does not exist.
+    :return: The open lock file, or None if another writer holds the lock.
+    """
+    lock_file = open(path, "a")
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+
+    return lock_file
+
+
+def release_lock(lock_file):
+    """
+    Release a lock and remove its lock file.
+    :param lock_file: The open lock file, see try_lock.
+    """
+    Path(lock_file.name).unlink(missing_ok=True)
+    lock_file.close()
+
+
+def close_segment(path):
+    """
+    Mark a segment as closed by renaming it.
+    :param path: The path of the open segment.
+    :return: The path of the closed segment.
+    """
+    path = Path(path)
+    segment = parse_segment_name(path)
+    if segment is None or segment["closed"]:
+        return path
+
+    closed_path = path.with_name(segment_name(segment["window_start"], segment["sequence"], True))
+    path.rename(closed_path)
+
+    return closed_path
+
+
+class SegmentWriter:
+    """
+    Class to write rows to rotating, sequence numbered log file segments in one folder.
+    """
+
+    def __init__(self, folder, policy):
+        """
+        Initialize the SegmentWriter.
+        :param folder: The folder that contains the segments.
+        :param policy: The RotationPolicy of the segments.
+        """
+        self.folder = Path(folder)
+        self.policy = policy
+        self.path = None
+        self.lock_file = None
+        self.window_start = None
+        self.size = 0
+        self.sequence = 0
+
+        for path in self.folder.iterdir():
+            segment = parse_segment_name(path)
+            if segment is None:
+                if path.suffix == ".lock" and not any(self.folder.glob(f"{path.stem}.open.csv")):
+                    # Lock files of segments that were never created are left behind by interrupted writers.
+                    lock_file = try_lock(path)
+                    if lock_file is not None:
+                        release_lock(lock_file)
+                continue
+            self.sequence = max(self.sequence, segment["sequence"] + 1)
+            if not segment["closed"]:
+                self.close_abandoned_segment(path, segment)
+
+    def close_abandoned_segment(self, path, segment):
+        """
+        Close an open segment if no writer holds its lock, i.e., if it belongs to a measurement that did not stop
+        cleanly. Segments of live writers, e.g., of another measurement of the same experiment, are left open. Private
+        method.
+        :param path: The path of the open segment.
+        :param segment: The parsed name of the segment.
+        """
+        lock_file = try_lock(lock_path(segment["window_start"], segment["sequence"], self.folder))
+        if lock_file is None:
+            return
+        try:
+            close_segment(path)
+        except FileNotFoundError:
+            # The writer closed the segment after it was listed.
+            pass
+        finally:
+            release_lock(lock_file)
+
+    def open_segment(self, timestamp):
+        """
+        Close the current segment and open a new one. Private method.
+        :param timestamp: The timestamp of the first row of the new segment.
+        """
+        self.close()
+        self.window_start = self.policy.window_start(timestamp)
+
+        # Several writers can share a folder, so a sequence number is taken only once its lock is held and no segment
+        # with it exists. Otherwise, the next sequence number is tried.
+        while True:
+            sequence = self.sequence
+            self.sequence += 1
+            lock_file = try_lock(lock_path(self.window_start, sequence, self.folder))
+            if lock_file is None:
+                continue
+            if any((self.folder / name).exists() for name in [segment_name(self.window_start, sequence, True),
+                                                                f"{self.window_start}_{sequence:06d}{archive_suffix}"]):
+                release_lock(lock_file)
+                continue
+            path = self.folder / segment_name(self.window_start, sequence, False)
+            try:
+                log_file = open(path, 'x', newline='')
+            except FileExistsError:
+                release_lock(lock_file)
+                continue
+            break
+
+        self.path = path
+        self.lock_file = lock_file
+        with log_file:
+            writer = csv.writer(log_file)
+            writer.writerow(log_header)
+            self.size = log_file.tell()
+
+    def write(self, row, timestamp):
+        """
+        Write a row to the current segment and rotate it first if required.
+        :param row: The row to write.
+        :param timestamp: The time at which the row is written.
+        """
+        if self.path is None or self.policy.should_rotate(self.window_start, self.size, timestamp):
+            self.open_segment(timestamp)
+
+        if not self.path.exists():
+            raise RuntimeError(f"Log file {self.path} was closed or removed while it was written to")
+        with open(self.path, 'a', newline='') as log_file:
+            writer = csv.writer(log_file)
+            writer.writerow(row)
+            self.size = log_file.tell()
+
+    def close(self):
+        """
+        Close the current segment, if any.
+        """
+        if self.path is not None:
+            try:
+                close_segment(self.path)
+            finally:
+                release_lock(self.lock_file)
+                self.path = None
+                self.lock_file = None
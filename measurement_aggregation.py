@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def get_device_groups(settings_path="settings.json"):
+    """
+    Read the device groups of settings.json. A device group combines several smart plugs, e.g., the two power supplies
+    of a server or all machines of a distributed experiment, and is configured as an entry with the device type
+    "group" and the list of its devices, e.g., {"node": {"device_type": "group", "devices": ["psu_a", "psu_b"]}}.
+    :param settings_path: The path of the settings file.
+    :return: Dictionary of group names and the lists of their devices, empty if the settings file does not exist.
+    """
+    try:
+        with open(settings_path, "r") as file:
+            devices = json.load(file)
+    except FileNotFoundError:
+        return {}
+
+    return {name: device["devices"] for name, device in devices.items() if device.get("device_type") == "group"}
+
+
+def align_to_grid(timestamps, values, grid, max_gap, method="linear"):
+    """
+    Align a series of readings to a time grid without bridging gaps.
+    :param timestamps: The sorted timestamps of the readings.
+    :param values: The values of the readings. Gaps are NaN.
+    :param grid: The timestamps to align the readings to.
+    :param max_gap: The longest time in seconds between two readings that is bridged. Grid points in longer intervals,
+    in intervals that contain a gap, and outside the readings are NaN.
+    :param method: "linear" to interpolate between the readings around a grid point, or "asof" to use the last reading
+    at or before a grid point.
+    :return: NumPy array of the values at the grid points.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(timestamps) == 0:
+        return np.full(len(grid), np.nan)
+
+    right = np.searchsorted(timestamps, grid, side="right")
+    left = right - 1
+    after_start = left >= 0
+    inside = after_start & (right < len(timestamps))
+    left = left.clip(0, len(timestamps) - 1)
+    right = right.clip(0, len(timestamps) - 1)
+
+    left_time = timestamps[left]
+    left_value = values[left]
+    exact = after_start & (left_time == grid)
+    bridged = inside & (timestamps[right] - left_time <= max_gap)
+
+    if method == "asof":
+        aligned = np.where(after_start & (grid - left_time <= max_gap), left_value, np.nan)
+    elif method == "linear":
+        span = timestamps[right] - left_time
+        weight = np.divide(grid - left_time, span, out=np.zeros(len(grid)), where=span > 0)
+        # A NaN reading on either side of a grid point marks a gap, so the interpolated value is NaN as well.
+        aligned = np.where(bridged, left_value + weight * (values[right] - left_value), np.nan)
+        aligned = np.where(exact, left_value, aligned)
+    else:
+        raise ValueError(f"Method {method} must be either linear or asof")
+
+    return aligned
+
+
+def aggregate_devices(readings_by_device, step=None, max_gap=None, method="linear"):
+    """
+    Combine the readings of several smart plugs on a common time grid.
+    :param readings_by_device: Dictionary of device names and DataFrames with the columns timestamp, current_draw,
+    and total_draw.
+    :param step: The time between two grid points in seconds, or None for the median time between two readings of the
+    slowest device.
+    :param max_gap: The longest time in seconds between two readings that is bridged, or None for four steps.
+    :param method: "linear" or "asof", see align_to_grid.
+    :return: DataFrame with the timestamp, the combined current_draw, and the combined total_draw on the grid.
+    The grid covers the time that all devices were measured in. Raises a ValueError if a device has no readings, as
+    the sum of the other devices would understate the combined draw.
+    """
+    if not readings_by_device:
+        raise ValueError("No readings to aggregate")
+    missing_devices = [device for device, readings in readings_by_device.items() if
+                       "timestamp" not in readings.columns or len(readings) == 0]
+    if missing_devices:
+        raise ValueError(f"No readings of devices {', '.join(missing_devices)} to aggregate")
+    readings_by_device = {device: readings.sort_values(by="timestamp") for device, readings in
+                          readings_by_device.items()}
+
+    if step is None:
+        step = max(float(np.median(np.diff(readings["timestamp"].to_numpy()))) if len(readings) > 1 else 0
+                   for readings in readings_by_device.values())
+        if step <= 0:
+            step = 1.0
+    if max_gap is None:
+        max_gap = 4 * step
+
+    start = max(readings["timestamp"].iloc[0] for readings in readings_by_device.values())
+    end = min(readings["timestamp"].iloc[-1] for readings in readings_by_device.values())
+    if start > end:
+        raise ValueError("The devices were not measured at the same time")
+    grid = start + np.arange(int(np.floor((end - start) / step)) + 1) * step
+
+    current_draw = np.zeros(len(grid))
+    total_draw = np.zeros(len(grid))
+    for readings in readings_by_device.values():
+        timestamps = readings["timestamp"].to_numpy(dtype=np.float64)
+        current_draw += align_to_grid(timestamps, readings["current_draw"].to_numpy(dtype=np.float64), grid, max_gap,
+                                      method)
+
+        # The total draw is counted by the smart plug, so it is interpolated over gaps of the readings.
+        counter = readings["total_draw"].to_numpy(dtype=np.float64)
+        counted = ~np.isnan(counter)
+        if not counted.any():
+            total_draw += np.nan
+            continue
+        total_draw += align_to_grid(timestamps[counted], counter[counted] - counter[counted].min(), grid, np.inf,
+                                    method)
+
+    return pd.DataFrame({"timestamp": grid, "current_draw": current_draw, "total_draw": total_draw})
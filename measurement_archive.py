@@ -0,0 +1,254 @@
+import argparse
+import os
+import struct
+import tempfile
+import zlib
+from pathlib import Path
+from time import time
+
+import numpy as np
+
+from log_rotation import archive_suffix, is_closed_segment, log_header
+
+archive_magic = b"EMERSZ1\n"
+
+encoding_delta_of_delta = 0
+encoding_xor = 1
+encoding_decimal = 2
+
+# Readings with at most this many decimal places, e.g., as reported by most smart plugs, are stored as integers.
+max_decimal_places = 6
+
+
+def shuffle_bytes(values):
+    """
+    Compress 64-bit values with the bytes of all values grouped by their position, so that the mostly zero high
+    bytes of small values form long runs.
+    :param values: NumPy array of 64-bit values.
+    :return: The compressed bytes.
+    """
+    return zlib.compress(np.ascontiguousarray(values).view(np.uint8).reshape(-1, 8).T.tobytes())
+
+
+def unshuffle_bytes(data, rows):
+    """
+    Decompress 64-bit values compressed with shuffle_bytes.
+    :param data: The compressed bytes.
+    :param rows: The number of values.
+    :return: NumPy array of unsigned 64-bit values.
+    """
+    return np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(8, rows).T.copy().view(np.uint64).ravel()
+
+
+def zigzag(values):
+    """
+    Map signed integers to unsigned integers, so that values close to zero have small magnitudes.
+    """
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def unzigzag(values):
+    return ((values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64))
+
+
+def delta(values, order):
+    """
+    Get the differences of a given order, keeping the first value(s) so that cumulative sums restore the values.
+    """
+    for _ in range(order):
+        values = np.diff(values, prepend=np.int64(0))
+    return values
+
+
+def undelta(values, order):
+    for _ in range(order):
+        values = np.cumsum(values)
+    return values
+
+
+def find_decimal_places(values):
+    """
+    Find the smallest number of decimal places that represents all values exactly.
+    :param values: NumPy array of floats without NaN values.
+    :return: The number of decimal places, or None if there is none up to max_decimal_places.
+    """
+    for places in range(max_decimal_places + 1):
+        scaled = np.round(values * 10 ** places)
+        if np.abs(scaled).max(initial=0) >= 2 ** 53:
+            return None
+        if np.array_equal(scaled / 10 ** places, values):
+            return places
+    return None
+
+
+def encode_column(values, encoding):
+    """
+    Encode a column of readings losslessly.
+    :param values: NumPy array of float64 values.
+    :param encoding: encoding_delta_of_delta for timestamps, which increase at a near-constant step, or encoding_xor
+    for draws. Draws with few decimal places are encoded as delta encoded integers instead.
+    :return: The encoded bytes.
+    """
+    gaps = np.isnan(values)
+    places = find_decimal_places(values[~gaps]) if encoding == encoding_xor else None
+
+    if encoding == encoding_delta_of_delta:
+        # The bit patterns of positive floats with the same exponent increase linearly with their value.
+        encoded = zigzag(delta(values.view(np.int64), 2))
+    elif places is None:
+        bits = values.view(np.uint64)
+        encoded = bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))
+    else:
+        encoding = encoding_decimal
+        filled = values
+        if gaps.any():
+            # Gaps repeat the previous reading, so that they do not disturb the differences.
+            previous = np.maximum.accumulate(np.where(gaps, 0, np.arange(len(values))))
+            filled = np.nan_to_num(values[previous])
+        encoded = zigzag(delta(np.round(filled * 10 ** places).astype(np.int64), 1))
+
+    gap_data = zlib.compress(np.packbits(gaps).tobytes()) if encoding == encoding_decimal and gaps.any() else b""
+    value_data = shuffle_bytes(encoded)
+
+    return struct.pack("<BBII", encoding, places or 0, len(value_data), len(gap_data)) + value_data + gap_data
+
+
+def decode_column(data, offset, rows):
+    """
+    Decode a column of readings.
+    :param data: The bytes of the archive.
+    :param offset: The offset of the column in the archive.
+    :param rows: The number of readings.
+    :return: Tuple of (NumPy array of float64 values, offset of the next column).
+    """
+    encoding, places, value_length, gap_length = struct.unpack_from("<BBII", data, offset)
+    offset += struct.calcsize("<BBII")
+    encoded = unshuffle_bytes(data[offset:offset + value_length], rows)
+    offset += value_length
+
+    if encoding == encoding_delta_of_delta:
+        values = undelta(unzigzag(encoded), 2).view(np.float64)
+    elif encoding == encoding_xor:
+        values = np.bitwise_xor.accumulate(encoded).view(np.float64)
+    else:
+        values = undelta(unzigzag(encoded), 1) / 10 ** places
+        if gap_length:
+            gaps = np.unpackbits(np.frombuffer(zlib.decompress(data[offset:offset + gap_length]), dtype=np.uint8),
+                                 count=rows).astype(bool)
+            values[gaps] = np.nan
+    offset += gap_length
+
+    return values, offset
+
+
+def encode_measurements(timestamps, current_draw, total_draw):
+    """
+    Encode readings in the EMERS archive format: Timestamps are delta-of-delta encoded and draws are XOR encoded
+    against the previous reading (or delta encoded if they have few decimal places), as in Gorilla. The encoded values
+    are compressed with their bytes grouped by position instead of bit packed, so that they decode with vectorized
+    NumPy operations.
+    :param timestamps: The timestamps of the readings.
+    :param current_draw: The current draws of the readings. Gaps are NaN.
+    :param total_draw: The total draws of the readings. Gaps are NaN.
+    :return: The encoded bytes.
+    """
+    columns = [np.asarray(column, dtype=np.float64) for column in [timestamps, current_draw, total_draw]]
+    rows = len(columns[0])
+
+    return (archive_magic + struct.pack("<Q", rows) + encode_column(columns[0], encoding_delta_of_delta) +
+            encode_column(columns[1], encoding_xor) + encode_column(columns[2], encoding_xor))
+
+
+def decode_measurements(data):
+    """
+    Decode readings in the EMERS archive format.
+    :param data: The encoded bytes.
+    :return: Dictionary with NumPy arrays of the timestamp, current_draw, and total_draw of the readings.
+    """
+    if not data.startswith(archive_magic):
+        raise ValueError("Not an EMERS archive")
+    rows = struct.unpack_from("<Q", data, len(archive_magic))[0]
+    offset = len(archive_magic) + 8
+
+    readings = {}
+    for column in log_header:
+        readings[column], offset = decode_column(data, offset, rows)
+
+    return readings
+
+
+def read_archive(path):
+    """
+    Read an archived log file.
+    :param path: The path of the archived log file.
+    :return: DataFrame with the columns timestamp, current_draw, and total_draw.
+    """
+    import pandas as pd
+
+    with open(path, "rb") as file:
+        return pd.DataFrame(decode_measurements(file.read()))
+
+
+def archive_log_file(path, keep=False):
+    """
+    Archive a closed log file next to it and remove it once the archive is verified.
+    :param path: The path of the closed log file.
+    :param keep: Whether to keep the log file.
+    :return: The path of the archived log file.
+    """
+    import pandas as pd
+
+    path = Path(path)
+    readings = pd.read_csv(path)
+    columns = [readings[column].to_numpy(dtype=np.float64) for column in log_header]
+    data = encode_measurements(*columns)
+
+    decoded = decode_measurements(data)
+    for column, values in zip(log_header, columns):
+        if not np.array_equal(decoded[column], values, equal_nan=True):
+            raise ValueError(f"Archive of {path} does not match the log file")
+
+    archive_path = path.with_suffix(archive_suffix)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False, suffix=".tmp") as file:
+        file.write(data)
+        temporary_path = file.name
+    os.replace(temporary_path, archive_path)
+
+    if not keep:
+        path.unlink()
+
+    return archive_path
+
+
+def archive_measurements(folder, older_than, keep=False):
+    """
+    Archive all closed log files in a folder and its subfolders that were last written to before a given age.
+    :param folder: The folder, e.g., the measurements folder or the folder of one experiment.
+    :param older_than: The age in seconds.
+    :param keep: Whether to keep the log files.
+    :return: Tuple of (number of archived log files, bytes before, bytes after).
+    """
+    archived = 0
+    bytes_before = 0
+    bytes_after = 0
+    cutoff = time() - older_than
+    for path in sorted(Path(folder).rglob("*.csv")):
+        if not is_closed_segment(path) or path.stat().st_mtime > cutoff:
+            continue
+        bytes_before += path.stat().st_size
+        bytes_after += archive_log_file(path, keep).stat().st_size
+        archived += 1
+
+    return archived, bytes_before, bytes_after
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive old log files in the compressed EMERS archive format.')
+    parser.add_argument('--folder', type=str, required=False, default="./measurements")
+    parser.add_argument('--older_than_days', type=float, required=False, default=7)
+    parser.add_argument('--keep', action='store_true')
+    args = parser.parse_args()
+
+    archived_files, size_before, size_after = archive_measurements(args.folder, args.older_than_days * 86400,
+                                                                   args.keep)
+    print(f"Archived {archived_files} log files from {size_before} to {size_after} bytes.")
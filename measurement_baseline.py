@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from measurement_cache import file_signature
+
+# Baselines are read once per process and read again when the file changes, keyed by device name.
+loaded_baselines = {}
+
+
+def get_baseline_path(device_name):
+    """
+    Get the path of the idle baseline of a device.
+    :param device_name: The name of the device.
+    :return: The path of the baseline.
+    """
+    return Path(f"./measurements/{device_name}/baseline.json")
+
+
+def summarize_baseline(timestamps, current_draw, total_draw):
+    """
+    Summarize readings of an idle device.
+    :param timestamps: The timestamps of the readings.
+    :param current_draw: The current draws of the readings in W.
+    :param total_draw: The total draws of the readings in kWh.
+    :return: Dictionary with the number of readings, the duration, the mean, standard deviation, and percentiles of
+    the current draw, and the mean power implied by the total draw.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    current_draw = np.asarray(current_draw, dtype=np.float64)
+    total_draw = np.asarray(total_draw, dtype=np.float64)
+    if len(timestamps) < 2:
+        raise ValueError("A baseline needs at least two readings")
+
+    duration = float(timestamps[-1] - timestamps[0])
+    percentiles = np.percentile(current_draw, [5, 50, 95])
+    energy = float(np.nanmax(total_draw) - np.nanmin(total_draw))
+
+    return {
+        "captured_at": float(timestamps[-1]),
+        "readings": len(current_draw),
+        "duration": duration,
+        "mean_power": float(current_draw.mean()),
+        "std_power": float(current_draw.std()),
+        "min_power": float(current_draw.min()),
+        "p5_power": float(percentiles[0]),
+        "median_power": float(percentiles[1]),
+        "p95_power": float(percentiles[2]),
+        "max_power": float(current_draw.max()),
+        "energy_power": energy * 3600 * 1000 / duration if duration > 0 else None,
+    }
+
+
+def write_baseline(device_name, summary):
+    """
+    Store the idle baseline of a device.
+    :param device_name: The name of the device.
+    :param summary: The summary of the baseline, see summarize_baseline.
+    """
+    path = get_baseline_path(device_name)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, delete=False, suffix=".tmp") as file:
+        json.dump(summary, file, indent=2)
+        temporary_path = file.name
+    os.replace(temporary_path, path)
+
+
+def read_baseline(device_name):
+    """
+    Read the idle baseline of a device.
+    :param device_name: The name of the device.
+    :return: The summary of the baseline, or None if no baseline was captured for the device.
+    """
+    try:
+        with open(get_baseline_path(device_name), "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def load_baseline(device_name):
+    """
+    Read the idle baseline of a device only if it changed since it was last read, e.g., on every refresh of the
+    monitoring interface.
+    :param device_name: The name of the device.
+    :return: The summary of the baseline, or None if no baseline was captured for the device.
+    """
+    signature = file_signature(get_baseline_path(device_name))
+    if loaded_baselines.get(device_name, (None, None))[0] != signature:
+        loaded_baselines[device_name] = (signature, read_baseline(device_name))
+
+    return loaded_baselines[device_name][1]
+
+
+def net_energy(gross_energy, duration, baseline_power):
+    """
+    Subtract the idle baseline from the energy consumption of experiments.
+    :param gross_energy: Array of the measured energy consumption of each experiment in kWh.
+    :param duration: Array of the duration of each experiment in seconds.
+    :param baseline_power: Array of the idle baseline of the devices of each experiment in W, NaN if there is none.
+    :return: Array of the energy consumption of each experiment above the idle baseline in kWh, NaN if there is no
+    baseline.
+    """
+    gross_energy = np.asarray(gross_energy, dtype=np.float64)
+    duration = np.asarray(duration, dtype=np.float64)
+    baseline_power = np.asarray(baseline_power, dtype=np.float64)
+
+    return gross_energy - baseline_power * duration / 3600 / 1000
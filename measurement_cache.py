@@ -0,0 +1,120 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+
+def file_signature(path):
+    """
+    Get a signature of a file that changes whenever the file is written to.
+    :param path: The path of the file.
+    :return: Tuple of (path, modification time in nanoseconds, size), or (path, None, None) if the file is missing.
+    """
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return str(path), None, None
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+# Returned by DiskCache.get for values that are not cached, so that None can be cached like any other value.
+missing = object()
+
+
+class DiskCache:
+    """
+    Class to cache picklable values in a local folder. Writes are atomic, so the cache can be shared by several
+    processes, e.g., the workers of the monitoring interface.
+    """
+
+    def __init__(self, folder, max_bytes=1024 ** 3, enabled=True):
+        """
+        Initialize the DiskCache.
+        :param folder: The folder that stores the cached values.
+        :param max_bytes: The size of the cache in bytes above which the least recently written values are removed.
+        :param enabled: Whether values are cached at all.
+        """
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.written_bytes = 0
+
+    def _path(self, namespace, key):
+        """
+        Get the path of a cached value. Private method.
+        :param namespace: The namespace of the value, e.g., "readings".
+        :param key: Any value with a stable repr that identifies the cached value.
+        """
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return self.folder / namespace / f"{digest}.pickle"
+
+    def get(self, namespace, key, default=None):
+        """
+        Get a cached value.
+        :param namespace: The namespace of the value.
+        :param key: The key of the value.
+        :param default: The value returned if the value is not cached, e.g., missing to tell a cached None apart.
+        :return: The cached value, or the default if it is not cached.
+        """
+        if not self.enabled:
+            return default
+        try:
+            with open(self._path(namespace, key), "rb") as file:
+                return pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return default
+
+    def set(self, namespace, key, value):
+        """
+        Cache a value.
+        :param namespace: The namespace of the value.
+        :param key: The key of the value.
+        :param value: The picklable value.
+        """
+        if not self.enabled:
+            return
+        path = self._path(namespace, key)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False, suffix=".tmp") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            temporary_path = file.name
+            self.written_bytes += file.tell()
+        os.replace(temporary_path, path)
+
+        if self.written_bytes > self.max_bytes / 10:
+            self.written_bytes = 0
+            self.prune()
+
+    def get_or_compute(self, namespace, key, compute):
+        """
+        Get a cached value, or compute and cache it if it is not cached.
+        :param namespace: The namespace of the value.
+        :param key: The key of the value.
+        :param compute: Function without arguments that computes the value.
+        :return: The value.
+        """
+        value = self.get(namespace, key, missing)
+        if value is missing:
+            value = compute()
+            self.set(namespace, key, value)
+        return value
+
+    def prune(self):
+        """
+        Remove the least recently written values until the cache is smaller than its maximum size.
+        """
+        files = []
+        for path in self.folder.rglob("*.pickle"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(file[1] for file in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= file_size
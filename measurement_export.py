@@ -0,0 +1,436 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from log_rotation import archive_suffix, is_log_file, log_header, parse_segment_name
+from measurement_aggregation import get_device_groups
+from measurement_archive import read_archive
+from measurement_storage import (default_sqlite_path, iter_sqlite_measurements, list_sqlite_devices,
+                                 list_sqlite_experiments)
+
+export_columns = ["device", "experiment"] + log_header
+
+# Readings are timestamped by the meter, which can be slightly off the clock that log files are rotated by.
+segment_slack = 60
+
+
+def parse_time(value):
+    """
+    Parse a point in time of the command line.
+    :param value: A Unix timestamp in seconds or a date, e.g., "2024-05-01" or "2024-05-01T12:00:00Z". Dates without a
+    time zone are UTC.
+    :return: The Unix timestamp in seconds.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        timestamp = pd.Timestamp(value)
+        return (timestamp if timestamp.tzinfo is not None else timestamp.tz_localize("UTC")).timestamp()
+
+
+def merge_time_ranges(time_ranges):
+    """
+    Merge overlapping time ranges.
+    :param time_ranges: List of tuples of (start, end) in seconds, where None is open, or None for all time.
+    :return: Tuple of the arrays of the starts and ends of the merged time ranges, sorted by start.
+    """
+    if not time_ranges:
+        return np.array([-np.inf]), np.array([np.inf])
+
+    merged = []
+    for start, end in sorted((-np.inf if start is None else float(start), np.inf if end is None else float(end))
+                             for start, end in time_ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return np.array([start for start, _ in merged]), np.array([end for _, end in merged])
+
+
+def log_file_start(path):
+    """
+    Get the time from which a log file holds readings from its name, without opening it.
+    :param path: The path of the log file.
+    :return: The timestamp in seconds, or None if the name does not contain it.
+    """
+    segment = parse_segment_name(path)
+    if segment is not None:
+        return segment["window_start"]
+    try:
+        # Log files from before segment naming are named after the start of the measurement.
+        return float(Path(path).stem)
+    except ValueError:
+        return None
+
+
+def select_experiments(devices=None, experiments=None, measurements_folder="./measurements",
+                       sqlite_path=default_sqlite_path, settings_path="settings.json"):
+    """
+    Select the experiments to export.
+    :param devices: The names of the devices, or None for all devices. Device groups are exported as their devices.
+    :param experiments: The names of the experiments, or None for all experiments of the devices.
+    :param measurements_folder: The measurements folder.
+    :param sqlite_path: The path of the SQLite measurement store.
+    :param settings_path: The path of the settings file with the device groups.
+    :return: List of tuples of (device, experiment, log files), where the log files are sorted by time and empty for
+    experiments in the SQLite store.
+    """
+    measurements_folder = Path(measurements_folder)
+    sqlite_devices = list_sqlite_devices(sqlite_path)
+    if devices is None:
+        devices = sorted({item.name for item in measurements_folder.iterdir() if item.is_dir()} |
+                         set(sqlite_devices)) if measurements_folder.is_dir() else sqlite_devices
+    else:
+        device_groups = get_device_groups(settings_path)
+        devices = list(dict.fromkeys(member for device in devices for member in device_groups.get(device, [device])))
+
+    selection = []
+    for device in devices:
+        folder = measurements_folder / device
+        device_experiments = {item.name: sorted([path for path in item.iterdir() if is_log_file(path)],
+                                                key=lambda path: (log_file_start(path) or 0, path.name))
+                              for item in folder.iterdir() if item.is_dir()} if folder.is_dir() else {}
+        # Folders without log files, e.g., with only the work counters of an experiment, are read from SQLite.
+        device_experiments = {experiment: paths for experiment, paths in device_experiments.items() if paths}
+        if device in sqlite_devices:
+            for experiment in list_sqlite_experiments(device, sqlite_path):
+                device_experiments.setdefault(experiment, [])
+
+        for experiment in sorted(device_experiments):
+            if experiments is None or experiment in experiments:
+                selection.append((device, experiment, device_experiments[experiment]))
+
+    return selection
+
+
+def read_log_file_chunks(paths, start, end, chunk_rows):
+    """
+    Read log files in chunks. Log files that end before the start or start after the end are skipped unread. A log file
+    ends where the next log file starts a later time window, while log files rotated by size share their time window.
+    :param paths: The paths of the log files, sorted by time.
+    :param start: The first timestamp of interest.
+    :param end: The last timestamp of interest.
+    :param chunk_rows: The maximum number of readings of a chunk.
+    :return: Generator of DataFrames with the columns timestamp, current_draw, and total_draw.
+    """
+    starts = [log_file_start(path) for path in paths]
+    # The end of each log file is the start of the next later time window, found from the last log file backwards.
+    file_ends = [None] * len(paths)
+    for i in range(len(paths) - 2, -1, -1):
+        if starts[i] is not None and starts[i + 1] is not None:
+            file_ends[i] = starts[i + 1] if starts[i + 1] > starts[i] else file_ends[i + 1]
+
+    for i, path in enumerate(paths):
+        ends_before = file_ends[i] is not None and file_ends[i] + segment_slack < start
+        starts_after = starts[i] is not None and starts[i] - segment_slack > end
+        if ends_before or starts_after:
+            continue
+        try:
+            if Path(path).suffix == archive_suffix:
+                # Archives are bounded by the rotation of the log files and decoded at once.
+                readings = read_archive(path)
+                for offset in range(0, len(readings), chunk_rows):
+                    yield readings.iloc[offset:offset + chunk_rows]
+            else:
+                with pd.read_csv(path, chunksize=chunk_rows) as reader:
+                    yield from reader
+        except FileNotFoundError:
+            # The open log file was closed and renamed after it was listed.
+            continue
+
+
+def coalesce_chunks(chunks, chunk_rows):
+    """
+    Collect small chunks, e.g., of many short log files, so that each chunk is processed with few vectorized operations.
+    :param chunks: The chunks.
+    :param chunk_rows: The number of rows after which the collected chunks are combined.
+    :return: Generator of DataFrames with less than twice chunk_rows rows each.
+    """
+    buffer = []
+    buffered_rows = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered_rows += len(chunk)
+        if buffered_rows >= chunk_rows:
+            yield pd.concat(buffer, ignore_index=True)
+            buffer = []
+            buffered_rows = 0
+
+    if buffer:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+class EnergyIntegrator:
+    """
+    Class to integrate the current draw of a stream of readings to the energy consumption with the trapezoidal rule,
+    independently of the total draw that the smart plug counts. Failed readings and the boundaries of the selected time
+    ranges are not bridged.
+    """
+
+    def __init__(self, max_gap=None):
+        """
+        Initialize the EnergyIntegrator.
+        :param max_gap: The longest time in seconds between two readings that is bridged, or None to bridge all.
+        """
+        self.max_gap = max_gap
+        self.timestamp = np.nan
+        self.current_draw = np.nan
+        self.time_range = -1
+        self.energy = 0.0
+
+    def integrate(self, timestamps, current_draw, time_ranges):
+        """
+        Integrate the next readings of the stream.
+        :param timestamps: Array of the timestamps of the readings, sorted.
+        :param current_draw: Array of the current draws of the readings in W. Gaps are NaN.
+        :param time_ranges: Array of the index of the time range of each reading.
+        :return: Array of the energy consumption since the start of the stream at each reading in kWh.
+        """
+        timestamps = np.concatenate([[self.timestamp], timestamps])
+        current_draw = np.concatenate([[self.current_draw], current_draw])
+        time_ranges = np.concatenate([[self.time_range], time_ranges])
+
+        durations = np.diff(timestamps)
+        # Readings that were logged out of order are not integrated over.
+        bridged = (time_ranges[1:] == time_ranges[:-1]) & (durations >= 0)
+        if self.max_gap is not None:
+            bridged &= durations <= self.max_gap
+        with np.errstate(invalid="ignore"):
+            joules = (current_draw[1:] + current_draw[:-1]) / 2 * durations
+        energy = self.energy + np.cumsum(np.where(bridged & ~np.isnan(joules), joules, 0)) / 3600 / 1000
+
+        self.timestamp, self.current_draw, self.time_range = timestamps[-1], current_draw[-1], time_ranges[-1]
+        self.energy = energy[-1]
+        return energy
+
+
+class Resampler:
+    """
+    Class to resample a stream of readings to fixed time steps, aligned to the Unix epoch. Each step holds the mean
+    current draw and the last total draw of its readings. The last step is held back until the stream moves past it,
+    so that steps that span two chunks are not split.
+    """
+
+    def __init__(self, step):
+        """
+        Initialize the Resampler.
+        :param step: The length of a step in seconds.
+        """
+        self.step = step
+        self.pending = None
+
+    def add(self, readings):
+        """
+        Add the next readings of the stream.
+        :param readings: DataFrame with the timestamp, current_draw, total_draw, and optionally integrated_draw,
+        sorted by timestamp.
+        :return: DataFrame of the steps that are complete.
+        """
+        aggregations = {"current_draw_sum": ("current_draw", "sum"), "current_draw_count": ("current_draw", "count"),
+                        "readings": ("timestamp", "size"), "total_draw": ("total_draw", "last")}
+        if "integrated_draw" in readings.columns:
+            aggregations["integrated_draw"] = ("integrated_draw", "last")
+        steps = readings.groupby(np.floor(readings["timestamp"].to_numpy() / self.step), sort=True).agg(
+            **aggregations)
+        if steps.empty:
+            return self.format(steps)
+
+        if self.pending is not None:
+            if self.pending.index[0] == steps.index[0]:
+                first = steps.iloc[0].copy()
+                for column in ["current_draw_sum", "current_draw_count", "readings"]:
+                    first[column] += self.pending[column].iloc[0]
+                for column in ["total_draw", "integrated_draw"]:
+                    if column in steps.columns and np.isnan(first[column]):
+                        first[column] = self.pending[column].iloc[0]
+                steps.iloc[0] = first
+            else:
+                steps = pd.concat([self.pending, steps])
+
+        self.pending = steps.iloc[-1:]
+        return self.format(steps.iloc[:-1])
+
+    def finish(self):
+        """
+        End the stream.
+        :return: DataFrame of the last step.
+        """
+        pending, self.pending = self.pending, None
+        return self.format(pending)
+
+    def format(self, steps):
+        if steps is None:
+            return pd.DataFrame(columns=["timestamp", "current_draw", "total_draw", "readings"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            current_draw = steps["current_draw_sum"].to_numpy() / steps["current_draw_count"].to_numpy()
+        resampled = pd.DataFrame({"timestamp": steps.index.to_numpy() * self.step,
+                                  "current_draw": np.where(steps["current_draw_count"].to_numpy() > 0, current_draw,
+                                                           np.nan),
+                                  "total_draw": steps["total_draw"].to_numpy()})
+        if "integrated_draw" in steps.columns:
+            resampled["integrated_draw"] = steps["integrated_draw"].to_numpy()
+        resampled["readings"] = steps["readings"].to_numpy(dtype=np.int64)
+        return resampled
+
+
+def stream_experiment(device, experiment, paths, starts, ends, resample, integrate, max_gap, chunk_rows, sqlite_path):
+    """
+    Stream the readings of one experiment in the selected time ranges.
+    :param device: The name of the device.
+    :param experiment: The name of the experiment.
+    :param paths: The log files of the experiment, sorted by time, or an empty list to read from the SQLite store.
+    :param starts: The starts of the merged time ranges, see merge_time_ranges.
+    :param ends: The ends of the merged time ranges.
+    :return: Generator of DataFrames with the timestamp, current_draw, total_draw, and optionally integrated_draw and
+    readings. See export_measurements for the other parameters.
+    """
+    if paths:
+        chunks = read_log_file_chunks(paths, starts[0], ends[-1], chunk_rows)
+    else:
+        chunks = iter_sqlite_measurements(device, experiment, None if np.isinf(starts[0]) else starts[0],
+                                          None if np.isinf(ends[-1]) else ends[-1], chunk_rows, sqlite_path)
+    integrator = EnergyIntegrator(max_gap) if integrate else None
+    resampler = Resampler(resample) if resample else None
+
+    for chunk in coalesce_chunks(chunks, chunk_rows):
+        chunk = chunk[log_header].astype(np.float64).sort_values(by="timestamp", kind="stable")
+        timestamps = chunk["timestamp"].to_numpy()
+        time_ranges = np.searchsorted(starts, timestamps, side="right") - 1
+        selected = (time_ranges >= 0) & (timestamps <= ends[time_ranges.clip(0)])
+        chunk, time_ranges = chunk[selected], time_ranges[selected]
+        if chunk.empty:
+            continue
+
+        if integrator is not None:
+            chunk = chunk.assign(integrated_draw=integrator.integrate(chunk["timestamp"].to_numpy(),
+                                                                      chunk["current_draw"].to_numpy(), time_ranges))
+        if resampler is not None:
+            chunk = resampler.add(chunk)
+        yield chunk
+
+    if resampler is not None:
+        yield resampler.finish()
+
+
+def export_measurements(devices=None, experiments=None, time_ranges=None, resample=None, integrate=False,
+                        max_gap=None, chunk_rows=100000, output="pandas", measurements_folder="./measurements",
+                        sqlite_path=default_sqlite_path, settings_path="settings.json"):
+    """
+    Export readings as a stream of chunks, e.g., for external analysis pipelines. Log files and the SQLite store are
+    read in chunks as well, so that the memory stays constant regardless of the length of the experiments.
+    :param devices: The names of the devices, or None for all devices. Device groups are exported as their devices.
+    :param experiments: The names of the experiments, or None for all experiments of the devices.
+    :param time_ranges: List of tuples of (start, end) Unix timestamps in seconds, where None is open, or None for all
+    readings.
+    :param resample: The length of a step in seconds to resample the readings to, or None for the raw readings.
+    Resampled readings hold the mean current draw, the last total draw, and the number of readings of each step.
+    :param integrate: Whether to add the column integrated_draw, the energy consumption in kWh since the start of the
+    experiment, integrated from the current draw.
+    :param max_gap: The longest time in seconds between two readings that is integrated over, or None for all.
+    :param chunk_rows: The maximum number of rows of a chunk.
+    :param output: "pandas" for DataFrames or "arrow" for Arrow record batches (requires pyarrow).
+    :param measurements_folder: The measurements folder.
+    :param sqlite_path: The path of the SQLite measurement store.
+    :param settings_path: The path of the settings file with the device groups.
+    :return: Generator of chunks with the columns device, experiment, timestamp, current_draw, total_draw, and
+    optionally integrated_draw and readings, ordered by device, experiment, and timestamp.
+    """
+    if output not in ["pandas", "arrow"]:
+        raise ValueError(f"Unknown output {output}")
+
+    columns = export_columns + (["integrated_draw"] if integrate else []) + (["readings"] if resample else [])
+    if output == "arrow":
+        import pyarrow as pa
+
+        schema = pa.schema([(column, pa.string() if column in ["device", "experiment"] else
+                             pa.int64() if column == "readings" else pa.float64()) for column in columns])
+
+    def make_chunk(frames):
+        chunk = pd.concat(frames, ignore_index=True)[columns]
+        if output == "arrow":
+            return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False).combine_chunks().to_batches()[0]
+        return chunk
+
+    # Small chunks, e.g., of resampled readings, are collected into chunks of up to chunk_rows rows.
+    buffer = []
+    buffered_rows = 0
+    starts, ends = merge_time_ranges(time_ranges)
+    for device, experiment, paths in select_experiments(devices, experiments, measurements_folder, sqlite_path,
+                                                        settings_path):
+        for chunk in stream_experiment(device, experiment, paths, starts, ends, resample, integrate, max_gap,
+                                       chunk_rows, sqlite_path):
+            if chunk.empty:
+                continue
+            buffer.append(chunk.assign(device=device, experiment=experiment))
+            buffered_rows += len(chunk)
+            while buffered_rows >= chunk_rows:
+                rows = pd.concat(buffer, ignore_index=True)
+                yield make_chunk([rows.iloc[:chunk_rows]])
+                buffer = [rows.iloc[chunk_rows:]]
+                buffered_rows = len(buffer[0])
+
+    if buffered_rows > 0:
+        yield make_chunk(buffer)
+
+
+def write_export(chunks, path):
+    """
+    Write exported chunks to a file, one chunk at a time.
+    :param chunks: The chunks, see export_measurements.
+    :param path: The path of the file. The format is chosen by the suffix: ".csv", ".parquet" (requires pyarrow), or
+    ".arrow" for the Arrow IPC file format (requires pyarrow).
+    :return: The number of exported rows.
+    """
+    path = Path(path)
+    if path.suffix not in [".csv", ".parquet", ".arrow"]:
+        raise ValueError(f"Unknown export format {path.suffix}")
+    path.parent.mkdir(exist_ok=True, parents=True)
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if path.suffix == ".csv":
+                chunk.to_csv(path, mode="w" if rows == 0 else "a", header=rows == 0, index=False)
+            else:
+                import pyarrow.ipc
+                import pyarrow.parquet
+
+                if writer is None:
+                    writer = (pyarrow.parquet.ParquetWriter(path, chunk.schema) if path.suffix == ".parquet" else
+                              pyarrow.ipc.new_file(path, chunk.schema))
+                writer.write_batch(chunk)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export measurements in chunks to a CSV, Parquet, or Arrow file.')
+    parser.add_argument('--output', type=str, required=True)
+    parser.add_argument('--devices', type=str, nargs='+', required=False, default=None)
+    parser.add_argument('--experiments', type=str, nargs='+', required=False, default=None)
+    parser.add_argument('--time_range', type=str, nargs=2, action='append', required=False, default=None,
+                        metavar=('START', 'END'), help='Unix timestamp or date, "-" for open. Can be repeated.')
+    parser.add_argument('--resample', type=float, required=False, default=None)
+    parser.add_argument('--integrate', action='store_true')
+    parser.add_argument('--max_gap', type=float, required=False, default=None)
+    parser.add_argument('--chunk_rows', type=int, required=False, default=100000)
+    parser.add_argument('--measurements_folder', type=str, required=False, default="./measurements")
+    parser.add_argument('--sqlite_path', type=str, required=False, default=default_sqlite_path)
+    args = parser.parse_args()
+
+    export_time_ranges = None if args.time_range is None else [
+        tuple(None if value == "-" else parse_time(value) for value in time_range) for time_range in args.time_range]
+    exported_rows = write_export(export_measurements(args.devices, args.experiments, export_time_ranges,
+                                                     args.resample, args.integrate, args.max_gap, args.chunk_rows,
+                                                     "pandas" if Path(args.output).suffix == ".csv" else "arrow",
+                                                     args.measurements_folder, args.sqlite_path),
+                                 args.output)
+    print(f"Exported {exported_rows} rows to {args.output}.")
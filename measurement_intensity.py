@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from measurement_cache import file_signature
+
+intensity_columns = ["gco2e_per_kwh", "cost_per_kwh"]
+
+# Tables are loaded once per process and reloaded when the file changes, keyed by path.
+loaded_tables = {}
+
+
+class IntensityTable:
+    """
+    Class to look up time-varying carbon intensities and prices of energy, e.g., hourly values of the local grid. The
+    table is indexed by region and sorted by time, so that readings are joined to it with vectorized as-of lookups.
+    """
+
+    def __init__(self, table):
+        """
+        Initialize the IntensityTable.
+        :param table: DataFrame with a "timestamp" column (Unix timestamps in seconds or dates), an optional "region"
+        column, and a "gco2e_per_kwh" and/or "cost_per_kwh" column. Each value applies from its timestamp until the
+        next timestamp of the region.
+        """
+        if "timestamp" not in table.columns:
+            raise ValueError("An intensity table needs a timestamp column")
+        if not pd.api.types.is_numeric_dtype(table["timestamp"]):
+            dates = pd.to_datetime(table["timestamp"], utc=True)
+            table = table.assign(timestamp=(dates - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1))
+        if "region" not in table.columns:
+            table = table.assign(region="default")
+
+        self.index = {}
+        for region, rows in table.sort_values(by="timestamp", kind="stable").groupby("region", sort=True):
+            self.index[str(region)] = (rows["timestamp"].to_numpy(dtype=np.float64),
+                                       {column: rows[column].to_numpy(dtype=np.float64) for column in
+                                        intensity_columns if column in rows.columns})
+
+    @property
+    def regions(self):
+        return list(self.index.keys())
+
+    def lookup(self, region, column, timestamps):
+        """
+        Look up the value of a column at each timestamp.
+        :param region: The region.
+        :param column: "gco2e_per_kwh" or "cost_per_kwh".
+        :param timestamps: Array of timestamps.
+        :return: Array of the values at the timestamps, NaN before the first value or if the table has no values.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if region not in self.index or column not in self.index[region][1]:
+            return np.full(len(timestamps), np.nan)
+
+        table_timestamps, values = self.index[region][0], self.index[region][1][column]
+        positions = np.searchsorted(table_timestamps, timestamps, side="right") - 1
+        return np.where(positions >= 0, values[positions.clip(0)], np.nan)
+
+    def mean_intensity(self, region, column, timestamps, total_draw, default):
+        """
+        Get the mean value of a column over the energy consumption of an experiment, e.g., its mean carbon intensity.
+        :param region: The region.
+        :param column: "gco2e_per_kwh" or "cost_per_kwh".
+        :param timestamps: Array of the timestamps of the readings.
+        :param total_draw: Array of the total draws of the readings in kWh. Gaps are NaN.
+        :param default: The value for energy consumed at a time that the table has no value for.
+        :return: The mean value, weighted by the energy consumed between subsequent readings.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        total_draw = np.asarray(total_draw, dtype=np.float64)
+        counted = ~np.isnan(total_draw)
+        order = np.argsort(timestamps[counted])
+        timestamps, total_draw = timestamps[counted][order], total_draw[counted][order]
+
+        energy = np.diff(total_draw)
+        if len(energy) == 0 or energy.sum() <= 0:
+            return default
+
+        # Each interval between two readings is looked up at its midpoint.
+        values = self.lookup(region, column, (timestamps[1:] + timestamps[:-1]) / 2)
+        values = np.where(np.isnan(values), default, values)
+        return float((energy * values).sum() / energy.sum())
+
+
+def load_intensity_table(path):
+    """
+    Load an intensity table from a CSV or Parquet file.
+    :param path: The path of the file.
+    :return: The IntensityTable, or None if the file does not exist.
+    """
+    signature = file_signature(path)
+    if signature[1] is None:
+        return None
+    if loaded_tables.get(str(path), (None, None))[0] != signature:
+        if Path(path).suffix == ".parquet":
+            table = pd.read_parquet(path)
+        else:
+            table = pd.read_csv(path)
+        loaded_tables[str(path)] = (signature, IntensityTable(table))
+
+    return loaded_tables[str(path)][1]
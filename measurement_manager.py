@@ -1,12 +1,17 @@
 import asyncio
-import csv
 import json
 import threading
 from dataclasses import dataclass
 from pathlib import Path
-from time import time, sleep
+from time import time, sleep, perf_counter
 from typing import Optional
 
+from log_rotation import RotationPolicy
+from measurement_metrics import metrics, start_metrics_server, SummaryTimer
+from measurement_storage import CsvStorage, SqliteStorage, default_sqlite_path
+from measurement_work import WorkCounters
+from polling_resilience import RetryPolicy, CircuitBreaker, PollFailed, poll_with_retries
+
 stop_event = threading.Event()
 loop_thread = None
 
@@ -27,13 +32,28 @@ class MeasurementManager:
     Class to manage the measuring and logging of power data from a smart plug.
     """
 
-    def __init__(self, device_name, experiment_name=None, polling_rate=0.5, log_interval=300):
+    def __init__(self, device_name, experiment_name=None, polling_rate=0.5, log_interval=300, metrics_port=None,
+                 metrics_host="127.0.0.1", summary_interval=None, retry_policy=None, max_log_bytes=None,
+                 align_rotation=True, poller="thread", storage="csv", storage_path=default_sqlite_path):
         """
         Initialize the MeasurementManager.
         :param device_name: The name of the device that will be used to retrieve connection parameters.
         :param experiment_name: The name of the experiment that this data will be logged under.
         :param polling_rate: The rate at which the device will be polled for data in seconds.
-        :param log_interval: The interval at which the log file will be rotated in seconds.
+        :param log_interval: The interval at which the log file will be rotated in seconds. Rotation is aligned to
+        the wall clock, e.g., every 300 seconds on the 5th minute, unless align_rotation is False.
+        :param metrics_port: The port to serve Prometheus metrics on at /metrics, or None to not serve metrics.
+        :param metrics_host: The address to serve Prometheus metrics on.
+        :param summary_interval: The interval at which a metrics summary line is printed in seconds, or None.
+        :param retry_policy: The RetryPolicy for failed readings. Defaults to RetryPolicy().
+        :param max_log_bytes: The size in bytes at which the log file will be rotated early, or None.
+        :param align_rotation: Whether log rotation is aligned to the wall clock or to the start of the measurement.
+        :param poller: Where the device is polled when used as a context manager. "thread" polls in a background
+        thread of this process. "process" polls in a lightweight child process, so that polling does not compete
+        with the experiment for the GIL.
+        :param storage: Where readings are stored. "csv" writes rotating CSV log files to a folder per device and
+        experiment. "sqlite" writes to one SQLite database that many devices can write to at the same time.
+        :param storage_path: The path of the SQLite database if storage is "sqlite".
         """
         self.stop_event = threading.Event()
         self.loop_thread = None
@@ -41,6 +61,25 @@ class MeasurementManager:
         self.experiment_name = experiment_name
         self.polling_rate = polling_rate
         self.log_interval = log_interval
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.summary_interval = summary_interval
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.max_log_bytes = max_log_bytes
+        self.align_rotation = align_rotation
+        self.poller = poller
+        self.storage = storage
+        self.storage_path = storage_path
+        self.poller_process = None
+        self.shared_result = None
+        self.latest_result = None
+        self.samples = 0
+        self.work_counters = None
+
+        if self.poller not in ["thread", "process"]:
+            raise ValueError(f"Poller {self.poller} must be either thread or process")
+        if self.storage not in ["csv", "sqlite"]:
+            raise ValueError(f"Storage {self.storage} must be either csv or sqlite")
 
         with open("settings.json", "r") as file:
             devices = json.load(file)
@@ -49,12 +88,19 @@ class MeasurementManager:
             raise ValueError(f"Device {self.device_name} not found in settings.json")
 
         self.device = devices[self.device_name]
+        if self.device["device_type"] == "group":
+            raise ValueError(f"Device {self.device_name} is a device group, measure each of its devices instead")
 
     def _start_experiment_logging(self):
         """
         Start the experiment logging. Private method.
         """
-        if self.loop_thread is None or not self.loop_thread.is_alive():
+        if self.poller == "process":
+            if self.poller_process is None:
+                from measurement_poller import PollerProcess
+                self.poller_process = PollerProcess(self)
+                self.poller_process.start()
+        elif self.loop_thread is None or not self.loop_thread.is_alive():
             self.stop_event.clear()
 
             def async_intermediate():
@@ -75,6 +121,11 @@ class MeasurementManager:
         """
         Finish the experiment logging. Private method.
         """
+        if self.work_counters is not None:
+            self.work_counters.flush()
+        if self.poller_process is not None:
+            self.poller_process.stop()
+            self.poller_process = None
         if self.loop_thread is not None and self.loop_thread.is_alive():
             self.stop_event.set()
             self.loop_thread.join()
@@ -98,9 +149,84 @@ class MeasurementManager:
         """
         self._finish_experiment_logging()
 
-    async def log_data(self):
+    def _get_log_base(self):
         """
-        Log data from the smart plug.
+        Get the folder that the logs of this device and experiment are written to. Private method.
+        """
+        if self.experiment_name is not None:
+            log_base = Path(f"./measurements/{self.device_name}/{self.experiment_name}")
+        else:
+            log_base = Path(f"./measurements/{self.device_name}")
+        log_base.mkdir(exist_ok=True, parents=True)
+
+        return log_base
+
+    def mark_phase(self, name, timestamp=None):
+        """
+        Mark the start of a phase of the experiment, e.g., an epoch. Phase markers are written to "phases.jsonl" next
+        to the logs.
+        :param name: The name of the phase.
+        :param timestamp: The time at which the phase started. Defaults to now.
+        """
+        timestamp = time() if timestamp is None else timestamp
+        if self.poller_process is not None:
+            self.poller_process.send({"command": "phase", "name": name, "timestamp": timestamp})
+            return
+
+        with open(self._get_log_base() / "phases.jsonl", "a") as file:
+            file.write(json.dumps({"timestamp": timestamp, "phase": name}) + "\n")
+
+    def add_work(self, name, amount=1):
+        """
+        Count units of work of the experiment, e.g., training samples, inference requests, or epochs, so that the
+        monitoring interface can report the energy per unit of work. Counts are kept in memory and written next to the
+        logs at most once per polling interval, so this can be called for every batch or request.
+        :param name: The name of the counter, e.g., "samples".
+        :param amount: The number of units of work.
+        """
+        if self.work_counters is None:
+            self.work_counters = WorkCounters(self._get_log_base(), self.polling_rate)
+        self.work_counters.add(name, amount)
+
+    def get_latest_result(self):
+        """
+        Get the latest reading of the device.
+        :return: The latest MeasurementLogResult, or None if there is no reading yet.
+        """
+        if self.poller_process is not None:
+            latest_result = self.poller_process.latest_result()
+            if latest_result is None:
+                return None
+            return MeasurementLogResult(*latest_result)
+
+        return self.latest_result
+
+    def _publish_result(self, result):
+        """
+        Make a reading available to get_latest_result. Private method.
+        :param result: The MeasurementLogResult of the reading.
+        """
+        self.latest_result = result
+        self.samples += 1
+        if self.shared_result is not None:
+            from measurement_poller import state_ready
+            self.shared_result.write(state_ready, result.timestamp, result.current_draw, result.total_draw,
+                                     self.samples)
+
+    def _open_storage(self):
+        """
+        Open the storage backend that readings are written to. Private method.
+        """
+        if self.storage == "sqlite":
+            return SqliteStorage(self.storage_path, self.device_name, self.experiment_name)
+
+        rotation_policy = RotationPolicy(self.log_interval, self.max_log_bytes, self.align_rotation)
+        rotation_policy.start(time())
+        return CsvStorage(self._get_log_base(), rotation_policy)
+
+    def _get_api(self):
+        """
+        Import the function that reads the smart plug. Private method.
         """
         device_type = self.device["device_type"]
 
@@ -109,34 +235,104 @@ class MeasurementManager:
 
         try:
             module = __import__(module_name, fromlist=[function_name], globals={"__name__": __name__})
-            api = getattr(module, function_name)
+            return getattr(module, function_name)
         except ImportError as e:
             raise ImportError(f"Error importing module {module_name}: {e}")
 
-        if self.experiment_name is not None:
-            log_base = Path(f"./measurements/{self.device_name}/{self.experiment_name}")
-            log_base.mkdir(exist_ok=True, parents=True)
-        else:
-            log_base = Path(f"./measurements/{self.device_name}")
-            log_base.mkdir(exist_ok=True, parents=True)
+    async def capture_baseline(self, duration=60):
+        """
+        Measure the idle draw of the device and store a summary of it, so that the monitoring interface can report the
+        energy consumption of experiments above the idle draw. Run this while the machine is idle, not during an
+        experiment.
+        :param duration: The time to measure in seconds.
+        :return: The summary of the baseline.
+        """
+        from measurement_baseline import summarize_baseline, write_baseline
+
+        api = self._get_api()
+        readings = []
+        end = time() + duration
+        print(f"EMERS capturing idle baseline for device {self.device_name} for {duration} seconds.")
+        while time() < end:
+            try:
+                result: MeasurementLogResult = await poll_with_retries(api, self.device, self.retry_policy)
+                readings.append((result.timestamp, result.current_draw, result.total_draw))
+            except PollFailed as e:
+                print(f"EMERS reading failed for device {self.device_name}: {e}")
+            sleep(self.polling_rate)
+
+        timestamps, current_draw, total_draw = zip(*readings) if readings else ([], [], [])
+        summary = summarize_baseline(timestamps, current_draw, total_draw)
+        write_baseline(self.device_name, summary)
+        print(f"EMERS idle baseline of device {self.device_name} is {summary['mean_power']:.2f} W "
+              f"(standard deviation {summary['std_power']:.2f} W over {summary['readings']} readings).")
 
-        start_timestamp = time()
+        return summary
 
-        log_file_name = log_base / f"{start_timestamp}.csv"
+    async def log_data(self):
+        """
+        Log data from the smart plug.
+        """
+        api = self._get_api()
 
-        while not self.stop_event.is_set():
-            if not Path(log_file_name).exists() or start_timestamp + self.log_interval <= time():
-                if start_timestamp + self.log_interval <= time():
-                    start_timestamp += self.log_interval
-                log_file_name = log_base / f"{start_timestamp}.csv"
-                with open(log_file_name, 'w', newline='') as log_file:
-                    writer = csv.writer(log_file)
-                    writer.writerow(['timestamp', 'current_draw', 'total_draw'])
+        if self.metrics_port is not None:
+            start_metrics_server(self.metrics_port, self.metrics_host)
+        summary_timer = SummaryTimer(self.summary_interval)
 
-            result: MeasurementLogResult = await api(**self.device)
+        storage = self._open_storage()
 
-            with open(log_file_name, 'a', newline='') as log_file:
-                writer = csv.writer(log_file)
-                writer.writerow([result.timestamp, result.current_draw, result.total_draw])
+        # The time at which the loop should wake up from its last sleep, to measure how late it actually woke up.
+        intended_wakeup = None
+        breaker = CircuitBreaker(self.retry_policy.breaker_threshold, self.retry_policy.breaker_reset)
+        in_gap = False
 
-            sleep(self.polling_rate)
+        try:
+            while not self.stop_event.is_set():
+                poll_start = perf_counter()
+                if intended_wakeup is not None:
+                    metrics.observe("emers_scheduling_lag_seconds", self.device_name,
+                                    max(poll_start - intended_wakeup, 0))
+
+                if not breaker.allow():
+                    intended_wakeup = perf_counter() + self.polling_rate
+                    sleep(self.polling_rate)
+                    continue
+
+                try:
+                    result: MeasurementLogResult = await poll_with_retries(
+                        api, self.device, self.retry_policy,
+                        on_retry=lambda: metrics.increment("emers_retries_total", self.device_name),
+                        on_error=lambda e: metrics.increment("emers_errors_total", self.device_name))
+                except PollFailed as e:
+                    print(f"EMERS reading failed for device {self.device_name}: {e}")
+                    if breaker.record_failure():
+                        print(f"EMERS paused polling device {self.device_name} for {breaker.reset_timeout} seconds "
+                              f"after {breaker.failures} failed readings.")
+                        print(metrics.summary_line(self.device_name))
+                    if not in_gap:
+                        # An empty reading marks the start of a gap, so that plots and integration do not bridge it.
+                        gap_timestamp = time()
+                        storage.write([gap_timestamp, '', ''], gap_timestamp)
+                        in_gap = True
+                    intended_wakeup = perf_counter() + self.polling_rate
+                    sleep(self.polling_rate)
+                    continue
+
+                breaker.record_success()
+                in_gap = False
+                write_start = perf_counter()
+                metrics.observe("emers_meter_latency_seconds", self.device_name, write_start - poll_start)
+
+                storage.write([result.timestamp, result.current_draw, result.total_draw], time())
+
+                metrics.observe("emers_write_latency_seconds", self.device_name, perf_counter() - write_start)
+                metrics.increment("emers_samples_total", self.device_name)
+                self._publish_result(result)
+
+                if summary_timer.due():
+                    print(metrics.summary_line(self.device_name))
+
+                intended_wakeup = perf_counter() + self.polling_rate
+                sleep(self.polling_rate)
+        finally:
+            storage.close()
@@ -0,0 +1,208 @@
+import threading
+from time import time
+
+default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+metric_descriptions = {
+    "emers_meter_latency_seconds": ("histogram", "Round-trip latency of a smart plug reading."),
+    "emers_write_latency_seconds": ("histogram", "Latency of writing a reading to the log."),
+    "emers_scheduling_lag_seconds": ("histogram", "Delay of a poll behind its scheduled time."),
+    "emers_samples_total": ("counter", "Number of readings written to the log."),
+    "emers_retries_total": ("counter", "Number of retried smart plug readings."),
+    "emers_errors_total": ("counter", "Number of failed smart plug readings."),
+}
+
+
+class Histogram:
+    """
+    Class to count observations in cumulative buckets, in the format of a Prometheus histogram.
+    """
+
+    def __init__(self, buckets=default_buckets):
+        """
+        Initialize the Histogram.
+        :param buckets: The sorted upper bounds of the buckets.
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """
+        Add an observation to the histogram.
+        :param value: The observed value.
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Estimate a quantile from the buckets.
+        :param q: The quantile between 0 and 1.
+        :return: The upper bound of the bucket that contains the quantile, capped at the largest observation.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, round(self.max, 4))
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Class to collect the per-device metrics of all MeasurementManagers in this process.
+    """
+
+    def __init__(self):
+        """
+        Initialize the MetricsRegistry.
+        """
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, device, value):
+        """
+        Add an observation to a histogram.
+        :param name: The name of the histogram.
+        :param device: The name of the device the observation belongs to.
+        :param value: The observed value.
+        """
+        with self.lock:
+            if (name, device) not in self.histograms:
+                self.histograms[(name, device)] = Histogram()
+            self.histograms[(name, device)].observe(value)
+
+    def increment(self, name, device, amount=1):
+        """
+        Increment a counter.
+        :param name: The name of the counter.
+        :param device: The name of the device the counter belongs to.
+        :param amount: The amount to increment the counter by.
+        """
+        with self.lock:
+            self.counters[(name, device)] = self.counters.get((name, device), 0) + amount
+
+    def render_prometheus(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+        :return: The metrics as a string.
+        """
+        lines = []
+        with self.lock:
+            for name, (metric_type, description) in metric_descriptions.items():
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+                if metric_type == "counter":
+                    for (counter_name, device), value in sorted(self.counters.items()):
+                        if counter_name == name:
+                            lines.append(f'{name}{{device="{device}"}} {value}')
+                else:
+                    for (histogram_name, device), histogram in sorted(self.histograms.items()):
+                        if histogram_name != name:
+                            continue
+                        cumulative = 0
+                        for bound, count in zip(histogram.buckets, histogram.counts):
+                            cumulative += count
+                            lines.append(f'{name}_bucket{{device="{device}",le="{bound}"}} {cumulative}')
+                        lines.append(f'{name}_bucket{{device="{device}",le="+Inf"}} {histogram.count}')
+                        lines.append(f'{name}_sum{{device="{device}"}} {histogram.sum}')
+                        lines.append(f'{name}_count{{device="{device}"}} {histogram.count}')
+
+        return "\n".join(lines) + "\n"
+
+    def summary_line(self, device):
+        """
+        Summarize the metrics of one device in a single line.
+        :param device: The name of the device.
+        :return: The summary as a string.
+        """
+        with self.lock:
+            samples = self.counters.get(("emers_samples_total", device), 0)
+            errors = self.counters.get(("emers_errors_total", device), 0)
+            retries = self.counters.get(("emers_retries_total", device), 0)
+            latencies = []
+            for name, label in [("emers_meter_latency_seconds", "meter latency"),
+                                ("emers_write_latency_seconds", "write latency"),
+                                ("emers_scheduling_lag_seconds", "scheduling lag")]:
+                histogram = self.histograms.get((name, device), Histogram())
+                latencies.append(f"{label} p50 {histogram.quantile(0.5)}s p95 {histogram.quantile(0.95)}s "
+                                 f"max {round(histogram.max, 4)}s")
+
+        return (f"EMERS metrics for device {device}: {samples} samples, {errors} errors, {retries} retries, "
+                + ", ".join(latencies) + ".")
+
+
+metrics = MetricsRegistry()
+
+metrics_servers = {}
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Start a background HTTP server that exposes the metrics of this process at /metrics. Starting a server on a port
+    that is already served by this process does nothing.
+    :param port: The port to serve the metrics on.
+    :param host: The address to serve the metrics on.
+    :return: The HTTP server.
+    """
+    if port in metrics_servers:
+        return metrics_servers[port]
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    metrics_servers[port] = server
+    print(f"EMERS metrics served at http://{host}:{port}/metrics.")
+
+    return server
+
+
+class SummaryTimer:
+    """
+    Class to decide when the next periodic summary line is due.
+    """
+
+    def __init__(self, interval):
+        """
+        Initialize the SummaryTimer.
+        :param interval: The interval between two summary lines in seconds, or None to disable summaries.
+        """
+        self.interval = interval
+        self.next_summary = time() + interval if interval else None
+
+    def due(self):
+        """
+        Check whether a summary line is due and schedule the next one if so.
+        :return: True if a summary line is due.
+        """
+        if self.next_summary is None or time() < self.next_summary:
+            return False
+        self.next_summary = max(self.next_summary + self.interval, time())
+        return True
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import os
+import struct
+import subprocess
+import sys
+import threading
+from dataclasses import asdict
+from multiprocessing import shared_memory
+from pathlib import Path
+from time import perf_counter, sleep
+
+# Layout of the shared memory block: sequence, state, timestamp, current draw, total draw, number of samples.
+shared_result_format = "qqdddq"
+
+state_starting = 0
+state_ready = 1
+state_failed = 2
+
+# Seconds a reader waits for a write in progress before it assumes that the writer died while it wrote the block.
+read_timeout = 1.0
+
+
+class SharedResult:
+    """
+    Class to share the state of the poller and its latest reading between the poller process and the experiment
+    process without locks. A sequence number that is odd while the block is written lets readers retry torn reads.
+    """
+
+    def __init__(self, name=None):
+        """
+        Initialize the SharedResult.
+        :param name: The name of an existing shared memory block to attach to, or None to create a new one.
+        """
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=struct.calcsize(shared_result_format))
+            struct.pack_into(shared_result_format, self.memory.buf, 0, 0, state_starting, 0, 0, 0, 0)
+            self.owner = True
+        else:
+            try:
+                self.memory = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # Python < 3.13 registers attached blocks with the resource tracker, which would unlink the block
+                # when the poller process exits.
+                from multiprocessing import resource_tracker
+                self.memory = shared_memory.SharedMemory(name=name)
+                resource_tracker.unregister(self.memory._name, "shared_memory")
+            self.owner = False
+        self.name = self.memory.name
+
+    def write(self, state, timestamp=0.0, current_draw=0.0, total_draw=0.0, samples=0):
+        """
+        Write the state and the latest reading.
+        :param state: The state of the poller.
+        :param timestamp: The timestamp of the latest reading.
+        :param current_draw: The current draw of the latest reading.
+        :param total_draw: The total draw of the latest reading.
+        :param samples: The number of readings so far.
+        """
+        sequence = struct.unpack_from("q", self.memory.buf, 0)[0]
+        struct.pack_into("q", self.memory.buf, 0, sequence + 1)
+        struct.pack_into(shared_result_format[1:], self.memory.buf, 8, state, timestamp, current_draw, total_draw,
+                         samples)
+        struct.pack_into("q", self.memory.buf, 0, sequence + 2)
+
+    def read(self):
+        """
+        Read the state and the latest reading.
+        :return: Tuple of (state, timestamp, current draw, total draw, number of samples).
+        """
+        deadline = perf_counter() + read_timeout
+        while True:
+            values = struct.unpack_from(shared_result_format, self.memory.buf, 0)
+            if values[0] % 2 == 0 and struct.unpack_from("q", self.memory.buf, 0)[0] == values[0]:
+                return values[1:]
+            if perf_counter() > deadline:
+                raise RuntimeError("The shared result was left half written, the EMERS poller process likely died "
+                                   "while it wrote it.")
+            sleep(0)
+
+    def close(self):
+        """
+        Detach from the shared memory block and remove it if it was created here.
+        """
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class PollerProcess:
+    """
+    Class to run the polling loop of a MeasurementManager in a child process, so that polling does not compete with
+    the experiment for the GIL.
+    """
+
+    def __init__(self, manager):
+        """
+        Initialize the PollerProcess.
+        :param manager: The MeasurementManager whose settings are used by the poller process.
+        """
+        self.arguments = {
+            "device_name": manager.device_name,
+            "experiment_name": manager.experiment_name,
+            "polling_rate": manager.polling_rate,
+            "log_interval": manager.log_interval,
+            "metrics_port": manager.metrics_port,
+            "metrics_host": manager.metrics_host,
+            "summary_interval": manager.summary_interval,
+            "retry_policy": asdict(manager.retry_policy),
+            "max_log_bytes": manager.max_log_bytes,
+            "align_rotation": manager.align_rotation,
+            "storage": manager.storage,
+            "storage_path": manager.storage_path,
+        }
+        self.process = None
+        self.shared_result = None
+
+    def start(self):
+        """
+        Start the poller process and wait until it is ready.
+        """
+        self.shared_result = SharedResult()
+        self.arguments["shared_memory"] = self.shared_result.name
+        self.process = subprocess.Popen([sys.executable, str(Path(__file__).resolve()), json.dumps(self.arguments)],
+                                        stdin=subprocess.PIPE, text=True, cwd=os.getcwd())
+
+        while self.shared_result.read()[0] == state_starting and self.process.poll() is None:
+            sleep(0.01)
+
+        if self.shared_result.read()[0] != state_ready:
+            self.stop()
+            raise RuntimeError(f"EMERS poller process for device {self.arguments['device_name']} failed to start.")
+
+    def check_alive(self):
+        """
+        Check that the poller process is still running and polling, and raise a RuntimeError otherwise.
+        """
+        return_code = self.process.poll()
+        if return_code is not None:
+            raise RuntimeError(f"EMERS poller process for device {self.arguments['device_name']} exited with code "
+                               f"{return_code}, measurements are no longer logged.")
+        if self.shared_result.read()[0] == state_failed:
+            raise RuntimeError(f"EMERS poller process for device {self.arguments['device_name']} failed, "
+                               f"measurements are no longer logged.")
+
+    def send(self, command):
+        """
+        Send a command to the poller process.
+        :param command: Dictionary with a "command" key and its arguments.
+        """
+        self.check_alive()
+        try:
+            self.process.stdin.write(json.dumps(command) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            # The poller process exited between the check and the write.
+            self.check_alive()
+            raise
+
+    def latest_result(self):
+        """
+        Get the latest reading of the poller process.
+        :return: Tuple of (timestamp, current draw, total draw), or None if there is no reading yet.
+        """
+        self.check_alive()
+        state, timestamp, current_draw, total_draw, samples = self.shared_result.read()
+        if samples == 0:
+            return None
+        return timestamp, current_draw, total_draw
+
+    def stop(self):
+        """
+        Stop the poller process and wait until it has closed its log file.
+        """
+        if self.process is not None:
+            if self.process.poll() is None:
+                try:
+                    self.process.stdin.write(json.dumps({"command": "stop"}) + "\n")
+                    self.process.stdin.close()
+                except (BrokenPipeError, OSError):
+                    pass
+                self.process.wait()
+            self.process = None
+        if self.shared_result is not None:
+            self.shared_result.close()
+            self.shared_result = None
+
+
+def run_poller(arguments):
+    """
+    Run the polling loop of the poller process until the experiment process stops it or exits.
+    :param arguments: The keyword arguments of the MeasurementManager and the name of the shared memory block.
+    """
+    from measurement_manager import MeasurementManager
+    from polling_resilience import RetryPolicy
+
+    shared_result = SharedResult(arguments.pop("shared_memory"))
+    arguments["retry_policy"] = RetryPolicy(**arguments["retry_policy"])
+
+    try:
+        manager = MeasurementManager(**arguments)
+    except Exception:
+        shared_result.write(state_failed)
+        raise
+    manager.shared_result = shared_result
+
+    def read_commands():
+        for line in sys.stdin:
+            command = json.loads(line)
+            if command["command"] == "phase":
+                manager.mark_phase(command["name"], command["timestamp"])
+            elif command["command"] == "stop":
+                break
+        # The experiment process stopped the poller or exited.
+        manager.stop_event.set()
+
+    threading.Thread(target=read_commands, daemon=True).start()
+    shared_result.write(state_ready)
+
+    try:
+        asyncio.run(manager.log_data())
+    except BaseException:
+        shared_result.write(state_failed)
+        raise
+    finally:
+        shared_result.close()
+
+
+if __name__ == '__main__':
+    run_poller(json.loads(sys.argv[1]))
@@ -0,0 +1,231 @@
+import sqlite3
+from abc import ABC, abstractmethod
+from pathlib import Path
+from time import time
+
+from log_rotation import SegmentWriter
+
+default_sqlite_path = "./measurements/emers.sqlite"
+
+sqlite_schema = """
+CREATE TABLE IF NOT EXISTS measurements (
+    device TEXT NOT NULL,
+    experiment TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    current_draw REAL,
+    total_draw REAL
+);
+CREATE INDEX IF NOT EXISTS measurements_device_experiment_timestamp
+    ON measurements (device, experiment, timestamp);
+"""
+
+
+class StorageBackend(ABC):
+    """
+    Base class of the storage backends that MeasurementManager writes readings to.
+    """
+
+    @abstractmethod
+    def write(self, row, timestamp):
+        """
+        Write a reading.
+        :param row: List of timestamp, current draw, and total draw. Gaps have empty draws.
+        :param timestamp: The time at which the row is written.
+        """
+
+    @abstractmethod
+    def close(self):
+        """
+        Write all buffered readings and release the storage.
+        """
+
+
+class CsvStorage(StorageBackend):
+    """
+    Class to store readings in rotating CSV log files in a folder per device and experiment.
+    """
+
+    def __init__(self, folder, policy):
+        """
+        Initialize the CsvStorage.
+        :param folder: The folder of the device and experiment.
+        :param policy: The RotationPolicy of the log files.
+        """
+        self.segment_writer = SegmentWriter(folder, policy)
+
+    def write(self, row, timestamp):
+        self.segment_writer.write(row, timestamp)
+
+    def close(self):
+        self.segment_writer.close()
+
+
+def connect_sqlite(path):
+    """
+    Open a SQLite measurement store in WAL mode, so that readers do not block writers, and create its schema.
+    :param path: The path of the SQLite database.
+    :return: The connection.
+    """
+    Path(path).parent.mkdir(exist_ok=True, parents=True)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(sqlite_schema)
+
+    return connection
+
+
+class SqliteStorage(StorageBackend):
+    """
+    Class to store readings of many devices in one SQLite database with batched transactional inserts.
+    """
+
+    def __init__(self, path, device_name, experiment_name, batch_size=100, flush_interval=1.0):
+        """
+        Initialize the SqliteStorage.
+        :param path: The path of the SQLite database.
+        :param device_name: The name of the device.
+        :param experiment_name: The name of the experiment, or None for readings without an experiment.
+        :param batch_size: The number of buffered readings after which they are inserted.
+        :param flush_interval: The time in seconds after which buffered readings are inserted.
+        """
+        self.connection = connect_sqlite(path)
+        self.device_name = device_name
+        self.experiment_name = experiment_name if experiment_name is not None else ""
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time()
+
+    def write(self, row, timestamp):
+        current_draw = row[1] if row[1] != '' else None
+        total_draw = row[2] if row[2] != '' else None
+        self.buffer.append((self.device_name, self.experiment_name, row[0], current_draw, total_draw))
+        if len(self.buffer) >= self.batch_size or self.last_flush + self.flush_interval <= timestamp:
+            self.flush()
+
+    def flush(self):
+        """
+        Insert all buffered readings in one transaction.
+        """
+        if self.buffer:
+            with self.connection:
+                self.connection.executemany("INSERT INTO measurements VALUES (?, ?, ?, ?, ?)", self.buffer)
+            self.buffer = []
+        self.last_flush = time()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def list_sqlite_devices(path=default_sqlite_path):
+    """
+    List the devices in a SQLite measurement store.
+    :param path: The path of the SQLite database.
+    :return: Sorted list of device names, empty if the database does not exist.
+    """
+    if not Path(path).exists():
+        return []
+    connection = connect_sqlite(path)
+    try:
+        # Walking the index with one lookup per device avoids scanning all readings.
+        devices = []
+        row = connection.execute("SELECT MIN(device) FROM measurements").fetchone()
+        while row[0] is not None:
+            devices.append(row[0])
+            row = connection.execute("SELECT MIN(device) FROM measurements WHERE device > ?", (row[0],)).fetchone()
+    finally:
+        connection.close()
+
+    return devices
+
+
+def list_sqlite_experiments(device, path=default_sqlite_path):
+    """
+    List the experiments of a device in a SQLite measurement store.
+    :param device: The name of the device.
+    :param path: The path of the SQLite database.
+    :return: Sorted list of experiment names.
+    """
+    connection = connect_sqlite(path)
+    try:
+        experiments = []
+        row = connection.execute("SELECT MIN(experiment) FROM measurements WHERE device = ?", (device,)).fetchone()
+        while row[0] is not None:
+            experiments.append(row[0])
+            row = connection.execute("SELECT MIN(experiment) FROM measurements WHERE device = ? AND experiment > ?",
+                                     (device, row[0])).fetchone()
+    finally:
+        connection.close()
+
+    return experiments
+
+
+def summarize_sqlite_experiment(device, experiment, path=default_sqlite_path):
+    """
+    Summarize the readings of an experiment with indexed lookups.
+    :param device: The name of the device.
+    :param experiment: The name of the experiment.
+    :param path: The path of the SQLite database.
+    :return: Dictionary with the number of readings, the first and last timestamp, and the lowest and highest total
+    draw.
+    """
+    connection = connect_sqlite(path)
+    try:
+        row = connection.execute("SELECT COUNT(*), MIN(timestamp), MAX(timestamp), MIN(total_draw), MAX(total_draw) "
+                                 "FROM measurements WHERE device = ? AND experiment = ?",
+                                 (device, experiment)).fetchone()
+    finally:
+        connection.close()
+
+    return {"readings": row[0], "first_timestamp": row[1], "last_timestamp": row[2], "min_total_draw": row[3],
+            "max_total_draw": row[4]}
+
+
+def read_sqlite_measurements(device, experiment, start=None, end=None, path=default_sqlite_path):
+    """
+    Read the readings of an experiment in a time range with an indexed range query.
+    :param device: The name of the device.
+    :param experiment: The name of the experiment.
+    :param start: The first timestamp to read, or None to read from the start.
+    :param end: The last timestamp to read, or None to read until the end.
+    :param path: The path of the SQLite database.
+    :return: DataFrame with the columns timestamp, current_draw, and total_draw, sorted by timestamp.
+    """
+    import pandas as pd
+
+    connection = connect_sqlite(path)
+    try:
+        return pd.read_sql_query("SELECT timestamp, current_draw, total_draw FROM measurements "
+                                 "WHERE device = ? AND experiment = ? AND timestamp >= ? AND timestamp <= ? "
+                                 "ORDER BY timestamp", connection,
+                                 params=(device, experiment, start if start is not None else float("-inf"),
+                                         end if end is not None else float("inf")))
+    finally:
+        connection.close()
+
+
+def iter_sqlite_measurements(device, experiment, start=None, end=None, chunk_rows=100000, path=default_sqlite_path):
+    """
+    Read the readings of an experiment in a time range in chunks, so that long experiments are read in constant memory.
+    :param device: The name of the device.
+    :param experiment: The name of the experiment.
+    :param start: The first timestamp to read, or None to read from the start.
+    :param end: The last timestamp to read, or None to read until the end.
+    :param chunk_rows: The maximum number of readings of a chunk.
+    :param path: The path of the SQLite database.
+    :return: Generator of DataFrames with the columns timestamp, current_draw, and total_draw, sorted by timestamp.
+    """
+    import pandas as pd
+
+    connection = connect_sqlite(path)
+    try:
+        yield from pd.read_sql_query("SELECT timestamp, current_draw, total_draw FROM measurements "
+                                     "WHERE device = ? AND experiment = ? AND timestamp >= ? AND timestamp <= ? "
+                                     "ORDER BY timestamp", connection,
+                                     params=(device, experiment, start if start is not None else float("-inf"),
+                                             end if end is not None else float("inf")),
+                                     chunksize=chunk_rows)
+    finally:
+        connection.close()
@@ -0,0 +1,108 @@
+import json
+from pathlib import Path
+from time import time, monotonic
+
+work_file_name = "work.jsonl"
+
+
+class WorkCounters:
+    """
+    Class to count units of work of an experiment, e.g., training samples, inference requests, or epochs. Counts are
+    accumulated in memory and their increments are appended to "work.jsonl" next to the measurements at most once per
+    flush interval, so that counting costs about as much as incrementing a dictionary entry. Several sessions of an
+    experiment append to the same file and their counts add up.
+    """
+
+    def __init__(self, folder, flush_interval=0.5):
+        """
+        Initialize the WorkCounters.
+        :param folder: The folder of the measurements of the experiment.
+        :param flush_interval: The time in seconds after which counts are written, e.g., the polling rate.
+        """
+        self.path = Path(folder) / work_file_name
+        self.flush_interval = flush_interval
+        self.increments = {}
+        self.next_flush = monotonic() + flush_interval
+
+    def add(self, name, amount=1):
+        """
+        Count units of work.
+        :param name: The name of the counter, e.g., "samples".
+        :param amount: The number of units of work.
+        """
+        self.increments[name] = self.increments.get(name, 0) + amount
+        if monotonic() >= self.next_flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the counts since they were last written, if there are any.
+        """
+        self.next_flush = monotonic() + self.flush_interval
+        if not self.increments:
+            return
+        increments, self.increments = self.increments, {}
+        with open(self.path, "a") as file:
+            file.write(json.dumps({"timestamp": time(), "increments": increments}) + "\n")
+
+
+def read_work(paths):
+    """
+    Read the work counters of an experiment.
+    :param paths: The paths of the work files of the experiment, e.g., one for each device of a device group.
+    Counters of several files are added up.
+    :return: DataFrame with the timestamp and the cumulative count of each counter, or None if there are no counts.
+    """
+    import pandas as pd
+
+    increments = []
+    for path in paths:
+        try:
+            with open(path, "r") as file:
+                flushes = [json.loads(line) for line in file if line.strip()]
+        except FileNotFoundError:
+            continue
+        if not flushes:
+            continue
+        increments.append(pd.DataFrame([flush["increments"] for flush in flushes],
+                                       index=[flush["timestamp"] for flush in flushes]))
+
+    if not increments:
+        return None
+
+    work = pd.concat(increments).fillna(0).sort_index().cumsum()
+    work.index.name = "timestamp"
+    return work.reset_index()
+
+
+def energy_per_work(readings, work):
+    """
+    Calculate the energy per unit of work between subsequent counts of each counter.
+    :param readings: DataFrame with the timestamp and total_draw in kWh of the readings of the experiment.
+    :param work: DataFrame with the timestamp and the cumulative counts, see read_work.
+    :return: Dictionary of counter names and tuples of (timestamps, energy per unit of work in J), where the
+    timestamps are the ends of the intervals between counts.
+    """
+    import numpy as np
+
+    timestamps = readings["timestamp"].to_numpy(dtype=np.float64)
+    total_draw = readings["total_draw"].to_numpy(dtype=np.float64)
+    counted = ~np.isnan(total_draw)
+    if not counted.any():
+        return {}
+    order = np.argsort(timestamps[counted])
+    timestamps, total_draw = timestamps[counted][order], total_draw[counted][order]
+    work_timestamps = work["timestamp"].to_numpy(dtype=np.float64)
+
+    # The energy at each count is interpolated from the total draw, which the smart plug counts over gaps.
+    energy = np.interp(work_timestamps, timestamps, total_draw) * 3600 * 1000
+    energy[(work_timestamps < timestamps[0]) | (work_timestamps > timestamps[-1])] = np.nan
+    joules = np.diff(energy)
+
+    efficiency = {}
+    for counter in work.columns.drop("timestamp"):
+        units = np.diff(work[counter].to_numpy(dtype=np.float64))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            efficiency[counter] = (work_timestamps[1:], np.where(units > 0, joules / units, np.nan))
+
+    return efficiency
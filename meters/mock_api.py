@@ -1,4 +1,4 @@
-from numpy import random
+import random
 from time import time
 
 from measurement_manager import MeasurementLogResult
@@ -10,8 +10,8 @@ async def get_data_mock(**kwargs) -> MeasurementLogResult:
     :param kwargs: No keyword arguments required
     :return: PowerLogResult containing energy readings with randomized values
     """
-    current_draw = random.randint(20, 250)
-    total_draw = random.randint(1, 5)
+    current_draw = random.randrange(20, 250)
+    total_draw = random.randrange(1, 5)
     timestamp = time()
 
     return MeasurementLogResult(timestamp=timestamp, current_draw=current_draw, total_draw=total_draw, misc=None)
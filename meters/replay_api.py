@@ -0,0 +1,94 @@
+import asyncio
+import bisect
+import csv
+from pathlib import Path
+from time import time
+
+from log_rotation import archive_suffix, is_log_file
+from measurement_manager import MeasurementLogResult
+
+# Recordings are loaded once per folder and shared by all virtual plugs that replay them.
+replay_traces = {}
+
+# Per-device replay state, keyed by "device_ip", so that many virtual plugs can run in one process.
+replay_devices = {}
+
+
+def load_trace(folder):
+    """
+    Load a recorded experiment for replay.
+    :param folder: The folder of the recorded experiment, e.g., "measurements/ExamplePlug/ExampleExperiment".
+    :return: Dictionary with the lists of the times since the first reading, the current draws (None for failed
+    readings), and the total draws relative to the first reading (the last known total draw for failed readings),
+    and the duration and energy of one pass of the recording.
+    """
+    rows = []
+    for path in sorted(Path(folder).iterdir()):
+        if not is_log_file(path):
+            continue
+        if path.suffix == archive_suffix:
+            from measurement_archive import decode_measurements
+            with open(path, "rb") as file:
+                readings = decode_measurements(file.read())
+            rows += zip(*[readings[column].tolist() for column in ["timestamp", "current_draw", "total_draw"]])
+        else:
+            with open(path, "r", newline="") as file:
+                rows += [(float(row["timestamp"]),
+                          float(row["current_draw"]) if row["current_draw"] else float("nan"),
+                          float(row["total_draw"]) if row["total_draw"] else float("nan"))
+                         for row in csv.DictReader(file)]
+    rows.sort()
+    if len(rows) < 2:
+        raise ValueError(f"Recording {folder} needs at least two readings to be replayed")
+
+    times = []
+    current_draws = []
+    total_draws = []
+    first_total_draw = next((total_draw for _, _, total_draw in rows if total_draw == total_draw), 0.0)
+    last_total_draw = first_total_draw
+    for timestamp, current_draw, total_draw in rows:
+        times.append(timestamp - rows[0][0])
+        # NaN is the only value that is not equal to itself.
+        current_draws.append(current_draw if current_draw == current_draw else None)
+        if total_draw == total_draw:
+            last_total_draw = total_draw
+        total_draws.append(last_total_draw - first_total_draw)
+
+    # One pass lasts until the time of the last reading plus the mean time between two readings, so that the first
+    # reading of the next pass is spaced like the others.
+    duration = times[-1] + times[-1] / (len(times) - 1)
+
+    return {"times": times, "current_draws": current_draws, "total_draws": total_draws, "duration": duration,
+            "energy": total_draws[-1]}
+
+
+async def get_data_replay(**kwargs) -> MeasurementLogResult:
+    """
+    Get data from a virtual meter that replays a recorded experiment, for load testing purposes
+    :param kwargs: Must include "device_ip" (used as the identifier of the virtual device). Optionally includes
+    "replay_path" (folder of the recorded experiment, default "measurements/ExamplePlug/ExampleExperiment"),
+    "speedup" (how much faster than recorded the recording is replayed, default 1), "replay_offset" (seconds of the
+    recording to skip, so that several virtual plugs replaying the same recording are not in sync, default 0), and
+    "latency_mean" (seconds, default 0)
+    :return: PowerLogResult containing the replayed readings. The recording is replayed in a loop and the total draw
+    keeps increasing from pass to pass
+    """
+    await asyncio.sleep(float(kwargs.get("latency_mean", 0)))
+
+    replay_path = kwargs.get("replay_path", "measurements/ExamplePlug/ExampleExperiment")
+    trace = replay_traces.get(replay_path)
+    if trace is None:
+        trace = replay_traces[replay_path] = load_trace(replay_path)
+
+    timestamp = time()
+    start = replay_devices.setdefault(kwargs["device_ip"], timestamp)
+    position = (timestamp - start) * float(kwargs.get("speedup", 1)) + float(kwargs.get("replay_offset", 0))
+    passes, position = divmod(position, trace["duration"])
+
+    index = max(bisect.bisect_right(trace["times"], position) - 1, 0)
+    current_draw = trace["current_draws"][index]
+    if current_draw is None:
+        raise Exception(f"Replayed reading of {kwargs['device_ip']} failed.")
+
+    return MeasurementLogResult(timestamp=timestamp, current_draw=current_draw,
+                                total_draw=passes * trace["energy"] + trace["total_draws"][index], misc=None)
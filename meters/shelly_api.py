@@ -1,3 +1,5 @@
+import asyncio
+
 from requests import post
 from time import time
 
@@ -7,7 +9,8 @@ from measurement_manager import MeasurementLogResult
 async def get_data_shelly(**kwargs) -> MeasurementLogResult:
     """
     Get data from Shelly Plug Plus S
-    :param kwargs: Must include "device_ip" and "device_id"
+    :param kwargs: Must include "device_ip" and "device_id". Optionally includes "request_timeout" (seconds, default
+    the request timeout of the RetryPolicy)
     :return: PowerLogResult containing energy readings
     """
     headers = {'Content-Type': 'application/x-www-form-urlencoded', }
@@ -15,7 +18,10 @@ async def get_data_shelly(**kwargs) -> MeasurementLogResult:
                     f'"src":"{kwargs["device_id"]}", '
                     '"method":"Switch.GetStatus", '
                     '"params":{"id":0}}')
-    response = post(f"http://{kwargs['device_ip']}/rpc", headers=headers, data=request_data)
+    # The blocking request runs in a thread, so that it does not block the polling of other devices and the timeout
+    # of the RetryPolicy applies.
+    response = await asyncio.to_thread(post, f"http://{kwargs['device_ip']}/rpc", headers=headers, data=request_data,
+                                       timeout=float(kwargs.get("request_timeout", 5)))
 
     if response.status_code != 200:
         raise Exception(f"API call failed. Status code: {response.status_code} \n Response: {response}")
@@ -0,0 +1,64 @@
+import asyncio
+import math
+import random
+from time import time
+
+from measurement_manager import MeasurementLogResult
+
+# Per-device simulation state, keyed by "device_ip", so that many simulated plugs can run in one process.
+simulated_devices = {}
+
+
+def sample_latency(distribution, mean, jitter):
+    """
+    Draw a round-trip latency for a simulated meter.
+    :param distribution: One of "constant", "uniform", "normal", or "lognormal".
+    :param mean: The mean latency in seconds.
+    :param jitter: The spread of the latency in seconds (half-width for uniform, standard deviation otherwise).
+    :return: The latency in seconds, never negative.
+    """
+    if distribution == "constant" or jitter <= 0:
+        latency = mean
+    elif distribution == "uniform":
+        latency = random.uniform(mean - jitter, mean + jitter)
+    elif distribution == "normal":
+        latency = random.gauss(mean, jitter)
+    elif distribution == "lognormal":
+        if mean <= 0:
+            latency = 0
+        else:
+            sigma_squared = math.log(1 + (jitter / mean) ** 2)
+            mu = math.log(mean) - sigma_squared / 2
+            latency = random.lognormvariate(mu, sigma_squared ** 0.5)
+    else:
+        raise ValueError(f"Unknown latency distribution {distribution}")
+
+    return max(latency, 0)
+
+
+async def get_data_simulated(**kwargs) -> MeasurementLogResult:
+    """
+    Get data from a simulated meter with a configurable latency and failure model, for benchmarking purposes
+    :param kwargs: Must include "device_ip" (used as the identifier of the simulated device). Optionally includes
+    "latency_distribution" (default "constant"), "latency_mean" (seconds, default 0.05), "latency_jitter"
+    (seconds, default 0), "failure_rate" (probability of a failed reading, default 0), "base_power" (W, default 150),
+    and "power_noise" (W, default 10)
+    :return: PowerLogResult containing energy readings with a continuously increasing total draw
+    """
+    latency = sample_latency(kwargs.get("latency_distribution", "constant"),
+                             float(kwargs.get("latency_mean", 0.05)),
+                             float(kwargs.get("latency_jitter", 0)))
+    await asyncio.sleep(latency)
+
+    if random.random() < float(kwargs.get("failure_rate", 0)):
+        raise Exception(f"Simulated API call to {kwargs['device_ip']} failed.")
+
+    timestamp = time()
+    current_draw = max(random.gauss(float(kwargs.get("base_power", 150)), float(kwargs.get("power_noise", 10))), 0)
+
+    state = simulated_devices.setdefault(kwargs["device_ip"], {"timestamp": timestamp, "total_draw": 0.0})
+    state["total_draw"] += current_draw * (timestamp - state["timestamp"]) / 3600 / 1000
+    state["timestamp"] = timestamp
+
+    return MeasurementLogResult(timestamp=timestamp, current_draw=round(current_draw, 1),
+                                total_draw=state["total_draw"], misc=None)
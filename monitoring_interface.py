@@ -1,29 +1,117 @@
 import argparse
 
 import json
+import os
+import sys
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from dash import Dash, html, dcc, callback, Output, Input, State, dash_table
 
 from time import time
 
-Path("./measurements").mkdir(exist_ok=True)
+from log_rotation import archive_suffix, is_log_file, parse_segment_name
+from measurement_aggregation import aggregate_devices, get_device_groups
+from measurement_archive import read_archive
+from measurement_baseline import load_baseline, net_energy
+from measurement_cache import DiskCache, file_signature
+from measurement_intensity import intensity_columns, load_intensity_table
+from measurement_storage import (default_sqlite_path, list_sqlite_devices, list_sqlite_experiments,
+                                 read_sqlite_measurements, summarize_sqlite_experiment)
+from measurement_work import energy_per_work, read_work, work_file_name
 
 app = Dash()
 app.title = "EMERS: Energy Meter for Recommender Systems"
 
-plug_options = [{"label": item.name, "value": str(item)} for
-                item in Path("./measurements/").iterdir() if item.is_dir()]
+# WSGI entry point, e.g., for "gunicorn monitoring_interface:server".
+server = app.server
+
+# Parsed measurements and figures are cached on disk, so that all workers of the interface share them.
+cache = DiskCache(os.environ.get("EMERS_CACHE_DIR", "./.emers_cache"),
+                  enabled=os.environ.get("EMERS_CACHE", "1") != "0")
+
+# Measurements in the SQLite store are selected with values of the form "sqlite:<device>/<experiment>".
+sqlite_prefix = "sqlite:"
+sqlite_path = os.environ.get("EMERS_SQLITE_PATH", default_sqlite_path)
+
+# Device groups of settings.json are selected with values of the form "group:<group>/<experiment>".
+group_prefix = "group:"
+
+
+def get_monitor_settings():
+    """
+    Read the default cost and footprint settings of the monitoring interface.
+    :return: Dictionary with the contents of monitor_settings.json.
+    """
+    with open("monitor_settings.json", "r") as monitor_settings_file:
+        return json.load(monitor_settings_file)
+
+
+def get_intensity_table():
+    """
+    Load the time-varying carbon intensities and prices of energy that monitor_settings.json points to.
+    :return: The IntensityTable, or None if no table is configured or the file does not exist.
+    """
+    path = get_monitor_settings().get("intensity_table")
+    return load_intensity_table(path) if path else None
+
+
+def get_region_options(intensity_table):
+    """
+    Get the regions of the intensity table.
+    :param intensity_table: The IntensityTable, or None.
+    :return: List of dropdown options, the constant values of the interface and one for each region of the table.
+    """
+    options = [{"label": "Constant", "value": ""}]
+    if intensity_table is not None:
+        options += [{"label": region, "value": region} for region in intensity_table.regions]
+    return options
+
+
+def has_log_files(folder):
+    """
+    Check whether a folder holds readings, as opposed to, e.g., only the work counters or phases of an experiment that
+    was measured to the SQLite store.
+    :param folder: The folder.
+    :return: True if the folder contains a log file.
+    """
+    return any(is_log_file(item) for item in Path(folder).iterdir())
+
+
+def get_plug_options():
+    """
+    Scan the measurements folder and the SQLite store for smart plugs.
+    :return: List of dropdown options, one for each smart plug folder, each smart plug in the SQLite store, and each
+    device group.
+    """
+    Path("./measurements").mkdir(exist_ok=True)
+    options = [{"label": item.name, "value": str(item)} for item in Path("./measurements/").iterdir() if
+               item.is_dir() and any(experiment.is_dir() and has_log_files(experiment) for experiment in
+                                     item.iterdir())]
+    options += [{"label": f"{device} (SQLite)", "value": f"{sqlite_prefix}{device}"}
+                for device in list_sqlite_devices(sqlite_path)]
+    options += [{"label": f"{group} (Group)", "value": f"{group_prefix}{group}"} for group in get_device_groups()]
+    return options
 
-with open("monitor_settings.json", "r") as monitor_settings_file:
-    monitor_settings = json.load(monitor_settings_file)
 
 report_button_selected_string_default = "Create report for selected experiments"
 report_button_all_string_default = "Create report for all experiments"
 
+report_format_options = [
+    {"label": "SVG figures", "value": "svg"},
+    {"label": "PNG figures (size-bounded)", "value": "png"},
+    {"label": "Self-contained HTML (size-bounded)", "value": "html"},
+]
+
+# Traces with more points than this are rendered with WebGL in the live dashboard.
+webgl_point_threshold = 20000
+
+# Traces in size-bounded reports are downsampled to at most this many points, enough for the 1800 pixel wide figures.
+report_max_points = 4000
+
 header_style = {
     'background-color': '#067B04',
     'color': 'white',
@@ -105,251 +193,313 @@ button_style = {
     'border-radius': '12px',
 }
 
-app.layout = [
-    html.Header(
-        style=header_style,
-        children=[
-            html.H1(
-                style={
-                    'margin': '1px',
-                    'fontSize': '32px',
-                    'font-weight': '300'
-                },
-                children='EMERS: Energy Meter for Recommender Systems'),
-        ]
-    ),
-    html.Div(
-        style={
-            'padding': '45px 20px',
-            'background-color': '#f4f4f4',
-            'min-height': '100vh',
-            'text-align': 'center'},
-        children=[
-            html.Div(
-                style=row_div_style,
-                children=[
-                    html.Div(
-                        style=box_div_style,
-                        children=[
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Label(
-                                        children='Smart Plug:',
-                                        title='Select a smart plug',
-                                        htmlFor='plug_dropdown',
-                                        style=label_style
-                                    ),
-                                    dcc.Dropdown(
-                                        options=plug_options,
-                                        value=plug_options[0]["value"],
-                                        id='plug_dropdown',
-                                        style=dropdown_style,
-                                        clearable=False
-                                    ),
-                                ]
-                            ),
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Label(
-                                        children='Experiment:',
-                                        title='Select an experiment',
-                                        htmlFor='experiment_dropdown',
-                                        style=label_style
-                                    ),
-                                    dcc.Dropdown(
-                                        id='experiment_dropdown',
-                                        multi=True,
-                                        style=dropdown_style
-                                    ),
-                                ]
-                            ),
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Label(
-                                        children='File:',
-                                        title='Select a file',
-                                        htmlFor='file_dropdown',
-                                        style=label_style
-                                    ),
-                                    dcc.Dropdown(
-                                        id='file_dropdown',
-                                        multi=True,
-                                        style=dropdown_style
-                                    ),
-                                ]
-                            ),
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Button(
-                                        children=report_button_selected_string_default,
-                                        id='report_selected_button',
-                                        n_clicks=0,
-                                        style=button_style
-                                    ),
-                                ]
-                            ),
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Button(
-                                        children=report_button_all_string_default,
-                                        id='report_all_button',
-                                        n_clicks=0,
-                                        style=button_style
-                                    ),
-                                ]
-                            ),
-                        ]
-                    ),
-                    html.Div(
-                        style=box_div_style,
-                        children=[
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Label(
-                                        children='Cost/kWh:',
-                                        title='Cost of energy per kWh',
-                                        htmlFor='cost_per_kwh',
-                                        style=label_style
-                                    ),
-                                    dcc.Input(
-                                        id='cost_per_kwh',
-                                        type='text',
-                                        value=monitor_settings["cost_per_kwh"],
-                                        style=input_style,
-                                        debounce=True
-                                    ),
-                                    html.Label(
-                                        children='Currency:',
-                                        title='Currency',
-                                        htmlFor='currency',
-                                        style=label_style
-                                    ),
-                                    dcc.Input(
-                                        id='currency',
-                                        type='text',
-                                        value=monitor_settings["currency"],
-                                        style=input_style,
-                                        debounce=True
-                                    ),
-                                ]
-                            ),
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Label(
-                                        children='gCO2e/kWh:',
-                                        title='Carbon footprint per kWh in gCO2e',
-                                        htmlFor='carbon_footprint',
-                                        style=label_style
-                                    ),
-                                    dcc.Input(
-                                        id='carbon_footprint',
-                                        type='text',
-                                        value=monitor_settings["gco2e_per_kwh"],
-                                        style=input_style,
-                                        debounce=True
-                                    ),
-                                    html.Label(
-                                        children='gCO2e/km:',
-                                        title='Carbon footprint per km in a car in gCO2e',
-                                        htmlFor='carbon_footprint_km',
-                                        style=label_style
-                                    ),
-                                    dcc.Input(
-                                        id='carbon_footprint_km',
-                                        type='text',
-                                        value=monitor_settings["gco2e_per_kilometer_car"],
-                                        style=input_style,
-                                        debounce=True
-                                    ),
-                                ]
-                            ),
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Label(
-                                        children='Update Interval (ms):',
-                                        title='Graph Update Interval (ms)',
-                                        htmlFor='graph_update_interval_input',
-                                        style=label_style
-                                    ),
-                                    dcc.Input(
-                                        id='graph_update_interval_input',
-                                        type='number',
-                                        value=1000,
-                                        style=input_style,
-                                        debounce=True
-                                    ),
-                                    dcc.Checklist(
-                                        id='graph_update_interval_toggle',
-                                        options=[{'label': 'Enable', 'value': 'ON'}],
-                                        labelStyle=checklist_label_style,
-                                        inputStyle=checklist_input_style
-                                    )
-                                ]
-                            ),
-                            html.Div(
-                                style=row_content_div_style,
-                                children=[
-                                    html.Label(
-                                        children='Smoothness Window:',
-                                        title='Graph Smoothness Rolling Window',
-                                        htmlFor='smoothness_input',
-                                        style=label_style
-                                    ),
-                                    dcc.Input(
-                                        id='smoothness_input',
-                                        type='number',
-                                        value=100,
-                                        min=1,
-                                        max=100000,
-                                        step=1,
-                                        style=input_style,
-                                        debounce=True
-                                    ),
-                                    dcc.Checklist(
-                                        id='graph_rolling_window_toggle',
-                                        options=[{'label': 'Enable', 'value': 'ON'}],
-                                        labelStyle=checklist_label_style,
-                                        inputStyle=checklist_input_style
-                                    )
-                                ]
-                            ),
-                        ]
-                    ),
-                ]
-            ),
-            html.Div(
-                style=box_div_style,
-                children=[
-                    dash_table.DataTable(id='experiment_data',
-                                         style_table={
-                                             'width': '100%',
-                                             'minWidth': '100%',
-                                             'overflowX': 'auto'
-                                         },
-                                         style_cell={
-                                             'fontSize': '18px'
-                                         })
-                ]
-            ),
-            html.Div(
-                style=box_div_style,
-                children=[
-                    dcc.Graph(id='plot_current_draw'),
-                    dcc.Graph(id='plot_total_draw'),
-                    dcc.Interval(id='graph_update_interval', interval=1000, n_intervals=0, disabled=True),
-                ]
-            )
-        ]
-    ),
-]
+
+def build_layout(plug_options, monitor_settings, region_options):
+    """
+    Build the layout of the monitoring interface.
+    :param plug_options: The dropdown options of the smart plugs.
+    :param monitor_settings: The default cost and footprint settings.
+    :param region_options: The dropdown options of the regions of the intensity table.
+    :return: The layout.
+    """
+    return html.Div(children=[
+        html.Header(
+            style=header_style,
+            children=[
+                html.H1(
+                    style={
+                        'margin': '1px',
+                        'fontSize': '32px',
+                        'font-weight': '300'
+                    },
+                    children='EMERS: Energy Meter for Recommender Systems'),
+            ]
+        ),
+        html.Div(
+            style={
+                'padding': '45px 20px',
+                'background-color': '#f4f4f4',
+                'min-height': '100vh',
+                'text-align': 'center'},
+            children=[
+                html.Div(
+                    style=row_div_style,
+                    children=[
+                        html.Div(
+                            style=box_div_style,
+                            children=[
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='Smart Plug:',
+                                            title='Select a smart plug',
+                                            htmlFor='plug_dropdown',
+                                            style=label_style
+                                        ),
+                                        dcc.Dropdown(
+                                            options=plug_options,
+                                            value=plug_options[0]["value"] if plug_options else None,
+                                            id='plug_dropdown',
+                                            style=dropdown_style,
+                                            clearable=False
+                                        ),
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='Experiment:',
+                                            title='Select an experiment',
+                                            htmlFor='experiment_dropdown',
+                                            style=label_style
+                                        ),
+                                        dcc.Dropdown(
+                                            id='experiment_dropdown',
+                                            multi=True,
+                                            style=dropdown_style
+                                        ),
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='File:',
+                                            title='Select a file',
+                                            htmlFor='file_dropdown',
+                                            style=label_style
+                                        ),
+                                        dcc.Dropdown(
+                                            id='file_dropdown',
+                                            multi=True,
+                                            style=dropdown_style
+                                        ),
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='Report Format:',
+                                            title='Select the format of the figures in reports',
+                                            htmlFor='report_format',
+                                            style=label_style
+                                        ),
+                                        dcc.Dropdown(
+                                            options=report_format_options,
+                                            value=report_format_options[0]["value"],
+                                            id='report_format',
+                                            style=dropdown_style,
+                                            clearable=False
+                                        ),
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Button(
+                                            children=report_button_selected_string_default,
+                                            id='report_selected_button',
+                                            n_clicks=0,
+                                            style=button_style
+                                        ),
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Button(
+                                            children=report_button_all_string_default,
+                                            id='report_all_button',
+                                            n_clicks=0,
+                                            style=button_style
+                                        ),
+                                    ]
+                                ),
+                            ]
+                        ),
+                        html.Div(
+                            style=box_div_style,
+                            children=[
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='Cost/kWh:',
+                                            title='Cost of energy per kWh',
+                                            htmlFor='cost_per_kwh',
+                                            style=label_style
+                                        ),
+                                        dcc.Input(
+                                            id='cost_per_kwh',
+                                            type='text',
+                                            value=monitor_settings["cost_per_kwh"],
+                                            style=input_style,
+                                            debounce=True
+                                        ),
+                                        html.Label(
+                                            children='Currency:',
+                                            title='Currency',
+                                            htmlFor='currency',
+                                            style=label_style
+                                        ),
+                                        dcc.Input(
+                                            id='currency',
+                                            type='text',
+                                            value=monitor_settings["currency"],
+                                            style=input_style,
+                                            debounce=True
+                                        ),
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='gCO2e/kWh:',
+                                            title='Carbon footprint per kWh in gCO2e',
+                                            htmlFor='carbon_footprint',
+                                            style=label_style
+                                        ),
+                                        dcc.Input(
+                                            id='carbon_footprint',
+                                            type='text',
+                                            value=monitor_settings["gco2e_per_kwh"],
+                                            style=input_style,
+                                            debounce=True
+                                        ),
+                                        html.Label(
+                                            children='gCO2e/km:',
+                                            title='Carbon footprint per km in a car in gCO2e',
+                                            htmlFor='carbon_footprint_km',
+                                            style=label_style
+                                        ),
+                                        dcc.Input(
+                                            id='carbon_footprint_km',
+                                            type='text',
+                                            value=monitor_settings["gco2e_per_kilometer_car"],
+                                            style=input_style,
+                                            debounce=True
+                                        ),
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='Region:',
+                                            title='Region of the time-varying cost and carbon footprint per kWh, '
+                                                  'or constant values',
+                                            htmlFor='region',
+                                            style=label_style
+                                        ),
+                                        dcc.Dropdown(
+                                            options=region_options,
+                                            value=monitor_settings.get("region") or "",
+                                            id='region',
+                                            style=dropdown_style,
+                                            clearable=False
+                                        ),
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='Update Interval (ms):',
+                                            title='Graph Update Interval (ms)',
+                                            htmlFor='graph_update_interval_input',
+                                            style=label_style
+                                        ),
+                                        dcc.Input(
+                                            id='graph_update_interval_input',
+                                            type='number',
+                                            value=1000,
+                                            style=input_style,
+                                            debounce=True
+                                        ),
+                                        dcc.Checklist(
+                                            id='graph_update_interval_toggle',
+                                            options=[{'label': 'Enable', 'value': 'ON'}],
+                                            labelStyle=checklist_label_style,
+                                            inputStyle=checklist_input_style
+                                        )
+                                    ]
+                                ),
+                                html.Div(
+                                    style=row_content_div_style,
+                                    children=[
+                                        html.Label(
+                                            children='Smoothness Window:',
+                                            title='Graph Smoothness Rolling Window',
+                                            htmlFor='smoothness_input',
+                                            style=label_style
+                                        ),
+                                        dcc.Input(
+                                            id='smoothness_input',
+                                            type='number',
+                                            value=100,
+                                            min=1,
+                                            max=100000,
+                                            step=1,
+                                            style=input_style,
+                                            debounce=True
+                                        ),
+                                        dcc.Checklist(
+                                            id='graph_rolling_window_toggle',
+                                            options=[{'label': 'Enable', 'value': 'ON'}],
+                                            labelStyle=checklist_label_style,
+                                            inputStyle=checklist_input_style
+                                        )
+                                    ]
+                                ),
+                            ]
+                        ),
+                    ]
+                ),
+                html.Div(
+                    style=box_div_style,
+                    children=[
+                        dash_table.DataTable(id='experiment_data',
+                                             style_table={
+                                                 'width': '100%',
+                                                 'minWidth': '100%',
+                                                 'overflowX': 'auto'
+                                             },
+                                             style_cell={
+                                                 'fontSize': '18px'
+                                             })
+                    ]
+                ),
+                html.Div(
+                    style=box_div_style,
+                    children=[
+                        dcc.Graph(id='plot_current_draw'),
+                        dcc.Graph(id='plot_total_draw'),
+                        dcc.Graph(id='plot_efficiency', style={'display': 'none'}),
+                        dcc.Interval(id='graph_update_interval', interval=1000, n_intervals=0, disabled=True),
+                    ]
+                )
+            ]
+        ),
+    ])
+
+
+def serve_layout():
+    """
+    Build the layout of the monitoring interface on page load, so that newly created smart plug folders and changed
+    settings show up without restarting the interface.
+    :return: The layout.
+    """
+    return build_layout(get_plug_options(), get_monitor_settings(), get_region_options(get_intensity_table()))
+
+
+# Callbacks are validated against a layout without data, so that importing this module does not touch the disk.
+app.validation_layout = build_layout([], dict.fromkeys(["cost_per_kwh", "currency", "gco2e_per_kwh",
+                                                         "gco2e_per_kilometer_car"]), [])
+app.layout = serve_layout
 
 
 @app.callback(
@@ -362,14 +512,19 @@ app.layout = [
     State(component_id='carbon_footprint_km', component_property='value'),
     State(component_id='smoothness_input', component_property='value'),
     Input(component_id='graph_rolling_window_toggle', component_property='value'),
+    State(component_id='report_format', component_property='value'),
+    State(component_id='region', component_property='value'),
     prevent_initial_call=True
 )
 def export_selected_experiments(n_clicks, files, cost_per_kwh, currency, carbon_footprint, carbon_footprint_km,
-                                smoothness, smoothness_toggle):
+                                smoothness, smoothness_toggle, report_format="svg", region=""):
     if n_clicks > 0:
+        max_points = None if report_format == "svg" else report_max_points
         try:
-            fig_cd, fig_td, information_df = make_graph(files, cost_per_kwh, currency, carbon_footprint,
-                                                        carbon_footprint_km, smoothness, smoothness_toggle, False)
+            fig_cd, fig_td, fig_efficiency, information_df = make_graph(files, cost_per_kwh, currency,
+                                                                        carbon_footprint, carbon_footprint_km,
+                                                                        smoothness, smoothness_toggle, False,
+                                                                        max_points, region)
         except ValueError:
             return f"Invalid selection"
 
@@ -378,13 +533,16 @@ def export_selected_experiments(n_clicks, files, cost_per_kwh, currency, carbon_
         report_folder = Path(f"./report/{timestamp}")
         report_folder.mkdir(exist_ok=True, parents=True)
 
-        export_cd = Path(f"{report_folder}/figure_current_draw.svg")
-        export_td = Path(f"{report_folder}/figure_total_draw.svg")
-        fig_cd.write_image(export_cd, engine="kaleido")
-        fig_td.write_image(export_td, engine="kaleido")
+        figure_html = (write_report_figure(fig_cd, report_folder, "figure_current_draw", report_format, True) +
+                       write_report_figure(fig_td, report_folder, "figure_total_draw", report_format, False))
+        if fig_efficiency.data:
+            figure_html += write_report_figure(fig_efficiency, report_folder, "figure_efficiency", report_format,
+                                               False)
 
         settings_dict = {"Cost/kWh": [cost_per_kwh], "Currency": [currency], "gCO2e/kWh": [carbon_footprint],
                          "gCO2e/km": [carbon_footprint_km]}
+        if region:
+            settings_dict["Region"] = [region]
 
         if smoothness_toggle is None or len(smoothness_toggle) == 0:
             pass
@@ -405,6 +563,7 @@ def export_selected_experiments(n_clicks, files, cost_per_kwh, currency, carbon_
                      f"{statement_total_consumption} kWh.<br>"
                      f"The total carbon footprint of the selected experiments is "
                      f"{statement_total_footprint} gCO2e.")
+        statement += net_energy_statement(information_df)
 
         html_string = '''
         <html>
@@ -419,12 +578,7 @@ def export_selected_experiments(n_clicks, files, cost_per_kwh, currency, carbon_
             </head>
             <body>
                 <h1>EMERS: Energy Meter for Recommender Systems Report</h1>
-                ''' + settings_table + '''
-                <iframe width="1800" height="600" frameborder="0" seamless="seamless" scrolling="no" \
-                src="./figure_current_draw.svg"></iframe>
-                <iframe width="1800" height="600" frameborder="0" seamless="seamless" scrolling="no" \
-                src="./figure_total_draw.svg"></iframe>
-                ''' + information_table + '''
+                ''' + settings_table + figure_html + information_table + '''
                 <h1>''' + statement + '''</h1>
             </body>
         </html>
@@ -437,14 +591,222 @@ def export_selected_experiments(n_clicks, files, cost_per_kwh, currency, carbon_
     return report_button_selected_string_default
 
 
-def read_file(item):
-    data_file = pd.read_csv(item)
+def net_energy_statement(information_df):
+    if 'Net Energy Consumption (kWh)' not in information_df.columns:
+        return ""
+    statement_net_consumption = \
+        information_df.loc[information_df['Experiment'] == 'Combined', 'Net Energy Consumption (kWh)'].iloc[0]
+    if np.isnan(statement_net_consumption):
+        # Some of the selected devices have no idle baseline.
+        return ""
+    return (f"<br>The energy consumption of the selected experiments above the idle baseline is "
+            f"{statement_net_consumption} kWh.")
+
+
+def write_report_figure(figure, report_folder, name, report_format, include_plotlyjs):
+    if report_format == "html":
+        # The plotly.js bundle is embedded once per report, so that the report also works offline.
+        return figure.to_html(full_html=False, include_plotlyjs=include_plotlyjs)
+
+    figure.write_image(Path(f"{report_folder}/{name}.{report_format}"), engine="kaleido")
+
+    if report_format == "png":
+        return f'''
+                <img width="1800" height="600" src="./{name}.png">
+                '''
+    return f'''
+                <iframe width="1800" height="600" frameborder="0" seamless="seamless" scrolling="no" \
+                src="./{name}.svg"></iframe>
+                '''
+
+
+def parse_file(item):
+    try:
+        if Path(item).suffix == archive_suffix:
+            data_file = read_archive(item)
+        else:
+            data_file = pd.read_csv(item)
+    except FileNotFoundError:
+        # The open log file was closed and renamed after it was listed.
+        return pd.DataFrame()
     if data_file.empty:
         return pd.DataFrame()
     else:
         return data_file
 
 
+def is_sqlite_selection(item):
+    return str(item).startswith(sqlite_prefix)
+
+
+def parse_sqlite_selection(item):
+    device, experiment = str(item)[len(sqlite_prefix):].split("/", 1)
+    return device, experiment
+
+
+def is_group_selection(item):
+    return str(item).startswith(group_prefix)
+
+
+def is_virtual_selection(item):
+    return is_sqlite_selection(item) or is_group_selection(item)
+
+
+def list_device_experiments(device):
+    folder = Path("./measurements") / device
+    experiments = {item.name for item in folder.iterdir() if item.is_dir()} if folder.is_dir() else set()
+    if Path(sqlite_path).exists():
+        experiments.update(list_sqlite_experiments(device, sqlite_path))
+    return experiments
+
+
+def get_device_experiment_items(device, experiment):
+    folder = Path("./measurements") / device / experiment
+    items = [item for item in folder.iterdir() if is_log_file(item)] if folder.is_dir() else []
+    if items:
+        return items
+    # Folders without log files, e.g., with only the work counters or phases of an experiment, are read from SQLite.
+    if Path(sqlite_path).exists():
+        return [f"{sqlite_prefix}{device}/{experiment}"]
+    return []
+
+
+def get_group_items(item):
+    group, experiment = str(item)[len(group_prefix):].split("/", 1)
+    return {device: get_device_experiment_items(device, experiment) for device in get_device_groups().get(group, [])}
+
+
+def read_group(item):
+    readings_by_device = {}
+    for device, items in get_group_items(item).items():
+        readings = [read_file(device_item) for device_item in items]
+        readings_by_device[device] = pd.concat(readings) if readings else pd.DataFrame()
+    return aggregate_devices(readings_by_device)
+
+
+def item_signature(item):
+    if is_group_selection(item):
+        # The combined readings change whenever the readings of a device of the group change.
+        return str(item), {device: [item_signature(device_item) for device_item in items] for device, items in
+                           get_group_items(item).items()}
+    if is_sqlite_selection(item):
+        # The number of readings and the last timestamp change whenever readings are inserted.
+        summary = summarize_sqlite_experiment(*parse_sqlite_selection(item), sqlite_path)
+        return str(item), summary["readings"], summary["last_timestamp"]
+    return file_signature(item)
+
+
+def is_live_item(item):
+    """
+    Check whether an item includes a segment that is still written to, whose signature changes with every reading.
+    :param item: The path of a log file, or a group or SQLite selection.
+    :return: True if the item includes an open segment.
+    """
+    if is_group_selection(item):
+        return any(is_live_item(device_item) for items in get_group_items(item).values() for device_item in items)
+    if is_sqlite_selection(item):
+        return False
+    segment = parse_segment_name(item)
+    return segment is not None and not segment["closed"]
+
+
+def get_item_devices(item):
+    if is_group_selection(item):
+        return list(get_group_items(item))
+    if is_sqlite_selection(item):
+        return [parse_sqlite_selection(item)[0]]
+    return [Path(item).parent.parent.name]
+
+
+def get_baseline_power(devices):
+    """
+    Get the idle baseline of devices that were measured together.
+    :param devices: The names of the devices.
+    :return: The sum of the mean idle draws of the devices in W, or NaN if a device has no baseline.
+    """
+    baseline_power = 0.0
+    for device in devices:
+        baseline = load_baseline(device)
+        if baseline is None:
+            return np.nan
+        baseline_power += baseline["mean_power"]
+    return baseline_power
+
+
+def get_item_folders(item):
+    if is_group_selection(item):
+        experiment = str(item).split("/", 1)[1]
+        return [Path("./measurements") / device / experiment for device in get_group_items(item)]
+    if is_sqlite_selection(item):
+        device, experiment = parse_sqlite_selection(item)
+        return [Path("./measurements") / device / experiment]
+    return [Path(item).parent]
+
+
+def read_experiment_work(folders):
+    paths = sorted({Path(folder) / work_file_name for folder in folders})
+    return cache.get_or_compute("work", [file_signature(path) for path in paths], lambda: read_work(paths))
+
+
+def calculate_efficiency(full_data, work_by_experiment):
+    """
+    Calculate the energy per unit of work of experiments.
+    :param full_data: Dictionary of experiments and their readings with absolute timestamps.
+    :param work_by_experiment: Dictionary of experiments and their work counters, see read_work.
+    :return: Dictionary of experiments and dictionaries with, for each counter, the total count, the energy per unit
+    of work over time in J, and the time in seconds since the first reading of the experiment.
+    """
+    efficiency_by_experiment = {}
+    for experiment, work in work_by_experiment.items():
+        readings = full_data.get(experiment)
+        if work is None or readings is None or "timestamp" not in readings.columns or readings.empty:
+            continue
+        start = readings["timestamp"].min()
+        efficiency_by_experiment[experiment] = {
+            counter: {"count": work[counter].iloc[-1], "time": timestamps - start, "joules": joules}
+            for counter, (timestamps, joules) in energy_per_work(readings, work).items()}
+
+    return efficiency_by_experiment
+
+
+def calculate_intensity(full_data, intensity_table, region, cost_per_kwh, carbon_footprint):
+    """
+    Calculate the mean cost and carbon footprint per kWh of experiments from the time-varying values of a region.
+    :param full_data: Dictionary of experiments and their readings with absolute timestamps.
+    :param intensity_table: The IntensityTable, or None to use the constant values.
+    :param region: The region of the intensity table.
+    :param cost_per_kwh: The constant cost per kWh, used where the table has no value.
+    :param carbon_footprint: The constant carbon footprint per kWh, used where the table has no value.
+    :return: Dictionary of experiments and dictionaries with the "cost_per_kwh" and "gco2e_per_kwh" weighted by the
+    energy consumed over time, or None if the constant values are used.
+    """
+    if intensity_table is None or not region:
+        return None
+
+    defaults = {"cost_per_kwh": float(cost_per_kwh), "gco2e_per_kwh": float(carbon_footprint)}
+    intensity_by_experiment = {}
+    for experiment, readings in full_data.items():
+        if "timestamp" not in readings.columns or readings.empty:
+            continue
+        intensity_by_experiment[experiment] = {
+            column: intensity_table.mean_intensity(region, column, readings["timestamp"], readings["total_draw"],
+                                                   defaults[column]) for column in intensity_columns}
+
+    return intensity_by_experiment
+
+
+def read_file(item):
+    if is_live_item(item):
+        # Caching the readings of an open segment would write a new copy to the cache on every refresh.
+        return read_group(item) if is_group_selection(item) else parse_file(item)
+    if is_group_selection(item):
+        return cache.get_or_compute("readings", item_signature(item), lambda: read_group(item))
+    if is_sqlite_selection(item):
+        return cache.get_or_compute("readings", item_signature(item),
+                                    lambda: read_sqlite_measurements(*parse_sqlite_selection(item), path=sqlite_path))
+    return cache.get_or_compute("readings", file_signature(item), lambda: parse_file(item))
+
+
 @app.callback(
     Output(component_id='report_all_button', component_property='children', allow_duplicate=True),
     Input(component_id='report_all_button', component_property='n_clicks'),
@@ -453,25 +815,43 @@ def read_file(item):
     State(component_id='carbon_footprint', component_property='value'),
     State(component_id='carbon_footprint_km', component_property='value'),
     State(component_id='smoothness_input', component_property='value'),
+    State(component_id='report_format', component_property='value'),
+    State(component_id='region', component_property='value'),
     prevent_initial_call=True
 )
-def export_all_experiments(n_clicks, cost_per_kwh, currency, carbon_footprint, carbon_footprint_km, smoothness):
+def export_all_experiments(n_clicks, cost_per_kwh, currency, carbon_footprint, carbon_footprint_km, smoothness,
+                           report_format="svg", region=""):
     if n_clicks > 0:
         full_data = {}
         for plug_folder in Path("./measurements").iterdir():
             if plug_folder.is_dir():
                 for experiment_folder in Path(plug_folder).iterdir():
-                    if experiment_folder.is_dir():
+                    if experiment_folder.is_dir() and has_log_files(experiment_folder):
                         with ThreadPoolExecutor() as executor:
                             full_data[experiment_folder] = pd.concat(
                                 list(executor.map(read_file, [item for item in
                                                               Path(experiment_folder).iterdir() if
-                                                              item.is_file()])))
+                                                              is_log_file(item)])))
+        baseline_by_experiment = {experiment_folder: get_baseline_power([experiment_folder.parent.name]) for
+                                  experiment_folder in full_data}
+        work_folders = {experiment_folder: [experiment_folder] for experiment_folder in full_data}
+        for device in list_sqlite_devices(sqlite_path):
+            for experiment in list_sqlite_experiments(device, sqlite_path):
+                full_data[f"{device}/{experiment}"] = read_file(f"{sqlite_prefix}{device}/{experiment}")
+                baseline_by_experiment[f"{device}/{experiment}"] = get_baseline_power([device])
+                work_folders[f"{device}/{experiment}"] = [Path("./measurements") / device / experiment]
 
         if not full_data:
             return "No data available"
 
-        scatter_data = make_scatters(full_data, smoothness, False)
+        work_by_experiment = {experiment: read_experiment_work(folders) for experiment, folders in
+                              work_folders.items()}
+        efficiency_by_experiment = calculate_efficiency(full_data, work_by_experiment)
+        intensity_by_experiment = calculate_intensity(full_data, get_intensity_table() if region else None, region,
+                                                      cost_per_kwh, carbon_footprint)
+
+        scatter_data = make_scatters(full_data, smoothness, False,
+                                     max_points=None if report_format == "svg" else report_max_points)
 
         all_figures = []
 
@@ -491,24 +871,23 @@ def export_all_experiments(n_clicks, cost_per_kwh, currency, carbon_footprint, c
 
         figure_html = ""
         for ind, figure in enumerate(all_figures):
-            export_cd = Path(f"{report_folder}/{ind}_figure_current_draw.svg")
-            export_td = Path(f"{report_folder}/{ind}_figure_total_draw.svg")
-            figure["fig_cd"].write_image(export_cd, engine="kaleido")
-            figure["fig_td"].write_image(export_td, engine="kaleido")
-
             figure_html += f'''
                 <h1>{figure["experiment"]}</h1>
-                <iframe width="1800" height="600" frameborder="0" seamless="seamless" scrolling="no" \
-                src="./''' + str(ind) + '''_figure_current_draw.svg"></iframe>
-                <iframe width="1800" height="600" frameborder="0" seamless="seamless" scrolling="no" \
-                src="./''' + str(ind) + '''_figure_total_draw.svg"></iframe>
             '''
+            figure_html += write_report_figure(figure["fig_cd"], report_folder, f"{ind}_figure_current_draw",
+                                               report_format, ind == 0)
+            figure_html += write_report_figure(figure["fig_td"], report_folder, f"{ind}_figure_total_draw",
+                                               report_format, False)
 
         information_df = calculate_information(scatter_data["total_power"], scatter_data["power_by_experiment"],
-                                               cost_per_kwh, currency, carbon_footprint, carbon_footprint_km)
+                                               cost_per_kwh, currency, carbon_footprint, carbon_footprint_km,
+                                               scatter_data["duration_by_experiment"], baseline_by_experiment,
+                                               efficiency_by_experiment, intensity_by_experiment)
 
         settings_dict = {"Cost/kWh": [cost_per_kwh], "Currency": [currency], "gCO2e/kWh": [carbon_footprint],
                          "gCO2e/km": [carbon_footprint_km]}
+        if region:
+            settings_dict["Region"] = [region]
 
         settings_table = pd.DataFrame.from_dict(settings_dict).to_html(index=False)
 
@@ -524,6 +903,7 @@ def export_all_experiments(n_clicks, cost_per_kwh, currency, carbon_footprint, c
                      f"{statement_total_consumption} kWh.<br>"
                      f"The total carbon footprint of the selected experiments is "
                      f"{statement_total_footprint} gCO2e.")
+        statement += net_energy_statement(information_df)
 
         html_string = '''
                 <html>
@@ -582,7 +962,17 @@ def update_interval(value):
 def update_experiment_dropdown(plug):
     if len(plug) == 0:
         return [], None
-    options = [{"label": item.name, "value": str(item)} for item in Path(plug).iterdir() if item.is_dir()]
+    if is_sqlite_selection(plug):
+        options = [{"label": experiment if experiment else "(continuous)", "value": f"{plug}/{experiment}"}
+                   for experiment in list_sqlite_experiments(plug[len(sqlite_prefix):], sqlite_path)]
+    elif is_group_selection(plug):
+        # Experiments of a group are the experiments that all of its devices measured.
+        devices = get_device_groups().get(plug[len(group_prefix):], [])
+        experiments = set.intersection(*[list_device_experiments(device) for device in devices]) if devices else set()
+        options = [{"label": experiment, "value": f"{plug}/{experiment}"} for experiment in sorted(experiments)]
+    else:
+        options = [{"label": item.name, "value": str(item)} for item in Path(plug).iterdir() if
+                   item.is_dir() and has_log_files(item)]
     if len(options) == 0:
         return [], None
     value = options[0]['value']
@@ -607,7 +997,8 @@ def update_file_dropdown(experiment):
     for ex in experiment:
         if ex[0] == '!':
             ex = ex[1:]
-        options += [{"label": item.name, "value": str(item)} for item in Path(ex).iterdir() if item.is_file()]
+        if not is_virtual_selection(ex):
+            options += [{"label": item.name, "value": str(item)} for item in Path(ex).iterdir() if is_log_file(item)]
         all_value += f"!{ex}"
 
     options.insert(0, {"label": "All", "value": all_value})
@@ -617,7 +1008,7 @@ def update_file_dropdown(experiment):
     return options, value, report_button_selected_string_default, report_button_all_string_default
 
 
-def get_experiment_files(files):
+def get_files_to_read(files):
     if files is None or len(files) == 0:
         raise ValueError
     if not type(files) == list:
@@ -631,12 +1022,23 @@ def get_experiment_files(files):
             folders = list(filter(None, folders))
 
             for folder in folders:
+                if is_virtual_selection(folder):
+                    # Readings in the SQLite store and of device groups are read per experiment.
+                    experiment = folder.split("/", 1)[1]
+                    if not experiment in files_to_read:
+                        files_to_read[experiment] = []
+                    files_to_read[experiment].append(folder)
+                    continue
+
                 folder = Path(folder)
+                items = [item for item in folder.iterdir() if is_log_file(item)]
+                if not items:
+                    continue
                 experiment = folder.name
                 if not experiment in files_to_read:
                     files_to_read[experiment] = []
 
-                files_to_read[experiment] += list(Path(folder).iterdir())
+                files_to_read[experiment] += items
         else:
             file = Path(file)
             experiment = file.parent.name
@@ -648,19 +1050,58 @@ def get_experiment_files(files):
     if not files_to_read:
         raise ValueError
 
+    return files_to_read
+
+
+def read_experiment_files(files_to_read):
     full_data = {}
     for experiment in files_to_read.keys():
         with ThreadPoolExecutor() as executor:
             full_data[experiment] = pd.concat(
-                list(executor.map(read_file, [item for item in files_to_read[experiment] if item.is_file()])))
+                list(executor.map(read_file, [item for item in files_to_read[experiment] if
+                                              is_virtual_selection(item) or item.is_file()])))
 
     return full_data
 
 
-def make_scatters(full_data, smoothness, autosize=False):
+def get_experiment_files(files):
+    return read_experiment_files(get_files_to_read(files))
+
+
+def downsample_min_max(x, y, max_points):
+    """
+    Downsample a trace to at most max_points points, keeping the minimum and maximum of each bucket of points so that
+    peaks stay visible. The first NaN value of each gap is always kept, so that the downsampled trace does not bridge
+    gaps, e.g., the runs of NaN values that the rolling window of smoothed traces spreads each gap to.
+    :param x: The x values of the trace.
+    :param y: The y values of the trace.
+    :param max_points: The maximum number of points, or None to not downsample.
+    :return: Tuple of (x, y) of the downsampled trace.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if max_points is None or len(y) <= max_points:
+        return x, y
+
+    buckets = max(max_points // 2, 1)
+    bucket = np.arange(len(y)) * buckets // len(y)
+    bucket_starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    gaps = np.isnan(y)
+
+    # Sorting by bucket and then by value puts the minimum (or maximum) of each bucket at the start of the bucket.
+    minima = np.lexsort((np.where(gaps, np.inf, y), bucket))[bucket_starts]
+    maxima = np.lexsort((np.where(gaps, np.inf, -y), bucket))[bucket_starts]
+    gap_starts = np.flatnonzero(gaps & ~np.concatenate([[False], gaps[:-1]]))
+    keep = np.unique(np.concatenate([minima, maxima, gap_starts]))
+
+    return x[keep], y[keep]
+
+
+def make_scatters(full_data, smoothness, autosize=False, max_points=None):
     scatters = []
 
     power_by_experiment = {}
+    duration_by_experiment = {}
     total_power = 0
 
     for experiment, readings in full_data.items():
@@ -673,20 +1114,24 @@ def make_scatters(full_data, smoothness, autosize=False):
         readings["total_draw"] = readings["total_draw"] - readings["total_draw"].min()
 
         power_by_experiment[experiment] = readings["total_draw"].max()
+        duration_by_experiment[experiment] = readings["timestamp"].max()
         total_power += readings["total_draw"].max()
 
         readings["total_draw_smooth"] = readings["total_draw"].rolling(window=smoothness).mean()
 
+        # Browsers render large SVG traces slowly, so the live dashboard switches to WebGL above a point threshold.
+        scatter = go.Scattergl if autosize and len(readings) > webgl_point_threshold else go.Scatter
+
+        def make_trace(column, name):
+            x, y = downsample_min_max(readings["timestamp"], readings[column], max_points)
+            return scatter(x=x, y=y, name=name)
+
         scatter_temp = {
             "experiment": experiment,
-            "cd": (go.Scatter(x=readings["timestamp"], y=readings["current_draw"],
-                              name=f'Raw Sensor Reading ({experiment})')),
-            "cds": (go.Scatter(x=readings["timestamp"], y=readings["current_draw_smooth"],
-                               name=f'Smoothed Sensor Reading ({experiment})')),
-            "td": (go.Scatter(x=readings["timestamp"], y=readings["total_draw"],
-                              name=f'Raw Sensor Reading ({experiment})')),
-            "tds": (go.Scatter(x=readings["timestamp"], y=readings["total_draw_smooth"],
-                               name=f'Smoothed Sensor Reading ({experiment})'))}
+            "cd": make_trace("current_draw", f'Raw Sensor Reading ({experiment})'),
+            "cds": make_trace("current_draw_smooth", f'Smoothed Sensor Reading ({experiment})'),
+            "td": make_trace("total_draw", f'Raw Sensor Reading ({experiment})'),
+            "tds": make_trace("total_draw_smooth", f'Smoothed Sensor Reading ({experiment})')}
 
         scatters.append(scatter_temp)
 
@@ -717,36 +1162,85 @@ def make_scatters(full_data, smoothness, autosize=False):
     scatters_layout["legend"] = {"orientation": "h", "yanchor": "bottom", "y": 1.02, "xanchor": "right", "x": 1}
 
     scatter_data = {"scatters": scatters, "scatters_layout": scatters_layout, "total_power": total_power,
-                    "power_by_experiment": power_by_experiment}
+                    "power_by_experiment": power_by_experiment, "duration_by_experiment": duration_by_experiment}
 
     return scatter_data
 
 
-def calculate_cost(power, cost_per_kwh, currency, carbon_footprint, carbon_footprint_km):
+def calculate_cost(power, cost_per_kwh, currency, carbon_footprint, carbon_footprint_km, net_power=None):
     cost_of_experiment = power * float(cost_per_kwh)
     emission_of_experiment = power * float(carbon_footprint)
     equivalent_by_car = float(emission_of_experiment) / float(carbon_footprint_km)
 
-    information_dict = {
-        "Total Energy Consumption (kWh)": round(power, 2),
+    information_dict = {"Total Energy Consumption (kWh)": round(power, 2)}
+
+    if net_power is not None:
+        # Energy consumption above the idle baseline of the devices.
+        information_dict["Net Energy Consumption (kWh)"] = round(float(net_power), 2)
+
+    information_dict.update({
         f"Cost of Experiment ({currency})": round(cost_of_experiment, 2),
         "Carbon Footprint of Experiment (gCO2e)": round(emission_of_experiment, 2),
         "Equivalent Distance by Car (km)": round(equivalent_by_car, 2)
-    }
+    })
 
     return information_dict
 
 
 def calculate_information(total_power, power_by_experiment, cost_per_kwh, currency, carbon_footprint,
-                          carbon_footprint_km):
+                          carbon_footprint_km, duration_by_experiment=None, baseline_by_experiment=None,
+                          efficiency_by_experiment=None, intensity_by_experiment=None):
     information_dict = {}
 
+    experiments = list(power_by_experiment.keys())
+    net_power = dict.fromkeys(experiments)
+    total_net_power = None
+    if duration_by_experiment is not None and baseline_by_experiment is not None:
+        baseline_power = np.array([baseline_by_experiment.get(experiment, np.nan) for experiment in experiments])
+        if not np.isnan(baseline_power).all():
+            net_powers = net_energy([power_by_experiment[experiment] for experiment in experiments],
+                                    [duration_by_experiment[experiment] for experiment in experiments],
+                                    baseline_power)
+            net_power = dict(zip(experiments, net_powers))
+            total_net_power = net_powers.sum()
+
+    # Experiments without time-varying values use the constant ones.
+    intensity_by_experiment = {experiment: (intensity_by_experiment or {}).get(experiment, {}) for experiment in
+                               experiments}
+    cost_by_experiment = {experiment: float(intensity.get("cost_per_kwh", cost_per_kwh)) for experiment, intensity in
+                          intensity_by_experiment.items()}
+    footprint_by_experiment = {experiment: float(intensity.get("gco2e_per_kwh", carbon_footprint)) for
+                               experiment, intensity in intensity_by_experiment.items()}
+
     for experiment, power in power_by_experiment.items():
-        information_dict[experiment] = calculate_cost(power, cost_per_kwh, currency, carbon_footprint,
-                                                      carbon_footprint_km)
+        information_dict[experiment] = calculate_cost(power, cost_by_experiment[experiment], currency,
+                                                      footprint_by_experiment[experiment], carbon_footprint_km,
+                                                      net_power[experiment])
+
+    # The combined cost and footprint per kWh are weighted by the energy consumption of the experiments.
+    if total_power > 0:
+        cost_per_kwh = sum(power_by_experiment[experiment] * cost_by_experiment[experiment] for experiment in
+                           experiments) / total_power
+        carbon_footprint = sum(power_by_experiment[experiment] * footprint_by_experiment[experiment] for experiment in
+                               experiments) / total_power
 
     information_dict["Combined"] = calculate_cost(total_power, cost_per_kwh, currency, carbon_footprint,
-                                                  carbon_footprint_km)
+                                                  carbon_footprint_km, total_net_power)
+
+    if efficiency_by_experiment:
+        counters = sorted({counter for efficiency in efficiency_by_experiment.values() for counter in efficiency})
+        for counter in counters:
+            counted = [experiment for experiment in experiments if
+                       counter in efficiency_by_experiment.get(experiment, {})]
+            joules = np.array([power_by_experiment[experiment] for experiment in counted]) * 3600 * 1000
+            counts = np.array([efficiency_by_experiment[experiment][counter]["count"] for experiment in counted])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                joules_per_unit = dict(zip(counted + ["Combined"],
+                                           np.append(joules / counts, joules.sum() / counts.sum())))
+            for experiment in information_dict:
+                # Energy per unit of work can be far below 1 J, so it is rounded to significant digits.
+                information_dict[experiment][f"Energy per {counter} (J)"] = \
+                    float(f"{joules_per_unit.get(experiment, np.nan):.4g}")
 
     information_df = pd.DataFrame.from_dict(information_dict, orient="index")
     information_df.reset_index(inplace=True)
@@ -755,37 +1249,113 @@ def calculate_information(total_power, power_by_experiment, cost_per_kwh, curren
     return information_df
 
 
+def make_efficiency_figure(efficiency_by_experiment, autosize):
+    scatters = [go.Scatter(x=efficiency["time"], y=efficiency["joules"], name=f'Energy per {counter} ({experiment})')
+                for experiment, efficiency_by_counter in efficiency_by_experiment.items()
+                for counter, efficiency in efficiency_by_counter.items()]
+
+    layout = go.Layout(title='Energy per Unit of Work (J) Over Time (s)',
+                       xaxis={"title": 'Time (s)'},
+                       yaxis={"title": 'Energy per Unit of Work (J)'})
+    if not autosize:
+        layout.update(autosize=False, width=1800, height=600)
+
+    fig_efficiency = go.Figure(data=scatters, layout=layout)
+    fig_efficiency.update_layout(legend={"orientation": "h", "yanchor": "bottom", "y": 1.02, "xanchor": "right",
+                                         "x": 1})
+
+    return fig_efficiency
+
+
 def make_graph(files, cost_per_kwh, currency, carbon_footprint, carbon_footprint_km, smoothness, smoothness_toggle,
-               autosize):
-    full_data = get_experiment_files(files)
+               autosize, max_points=None, region=None):
+    files_to_read = get_files_to_read(files)
+    intensity_path = get_monitor_settings().get("intensity_table") if region else None
+    baseline_by_experiment = {experiment: get_baseline_power({device for item in items for device in
+                                                              get_item_devices(item)})
+                              for experiment, items in files_to_read.items()}
+    work_folders = {experiment: {folder for item in items for folder in get_item_folders(item)}
+                    for experiment, items in files_to_read.items()}
+
+    item_signatures = {experiment: [item_signature(item) for item in items] for experiment, items in
+                       files_to_read.items()}
+    # The figures do not depend on the cost and footprint settings, so they are cached without them and changing a
+    # setting or the region only recomputes the experiment information.
+    graph_key = (item_signatures, smoothness, smoothness_toggle, autosize, max_points,
+                 {experiment: sorted(file_signature(Path(folder) / work_file_name) for folder in folders)
+                  for experiment, folders in work_folders.items()})
+
+    # The figures of experiments that are still measured change on every refresh, so they are not worth caching.
+    live = any(is_live_item(item) for items in files_to_read.values() for item in items)
+
+    full_data = None
+    intensity_by_experiment = None
+    if intensity_path:
+        def compute_intensity():
+            nonlocal full_data
+            # The intensities are looked up before make_scatters makes the timestamps relative.
+            full_data = read_experiment_files(files_to_read)
+            return calculate_intensity(full_data, load_intensity_table(intensity_path), region, cost_per_kwh,
+                                       carbon_footprint)
+
+        if live:
+            intensity_by_experiment = compute_intensity()
+        else:
+            intensity_by_experiment = cache.get_or_compute("intensities", (item_signatures, region,
+                                                                           file_signature(intensity_path),
+                                                                           cost_per_kwh, carbon_footprint),
+                                                           compute_intensity)
 
-    scatter_data = make_scatters(full_data, smoothness, autosize)
+    graph = None if live else cache.get("graphs", graph_key)
+    if graph is None:
+        if full_data is None:
+            full_data = read_experiment_files(files_to_read)
 
-    all_cd_scatters = [scatters["cd"] for scatters in scatter_data["scatters"]]
-    all_cds_scatters = [scatters["cds"] for scatters in scatter_data["scatters"]]
+        # Work counters are aligned to the readings before make_scatters makes the timestamps relative.
+        efficiency_by_experiment = calculate_efficiency(full_data, {experiment: read_experiment_work(folders) for
+                                                                    experiment, folders in work_folders.items()})
 
-    all_td_scatters = [scatters["td"] for scatters in scatter_data["scatters"]]
-    all_tds_scatters = [scatters["tds"] for scatters in scatter_data["scatters"]]
+        scatter_data = make_scatters(full_data, smoothness, autosize, max_points)
 
-    if smoothness_toggle is None or len(smoothness_toggle) == 0:
-        fig_cd = go.Figure(data=all_cd_scatters, layout=scatter_data["scatters_layout"]["cd"])
-        fig_td = go.Figure(data=all_td_scatters, layout=scatter_data["scatters_layout"]["td"])
-    else:
-        fig_cd = go.Figure(data=all_cd_scatters + all_cds_scatters, layout=scatter_data["scatters_layout"]["cd"])
-        fig_td = go.Figure(data=all_td_scatters + all_tds_scatters, layout=scatter_data["scatters_layout"]["td"])
+        all_cd_scatters = [scatters["cd"] for scatters in scatter_data["scatters"]]
+        all_cds_scatters = [scatters["cds"] for scatters in scatter_data["scatters"]]
+
+        all_td_scatters = [scatters["td"] for scatters in scatter_data["scatters"]]
+        all_tds_scatters = [scatters["tds"] for scatters in scatter_data["scatters"]]
+
+        if smoothness_toggle is None or len(smoothness_toggle) == 0:
+            fig_cd = go.Figure(data=all_cd_scatters, layout=scatter_data["scatters_layout"]["cd"])
+            fig_td = go.Figure(data=all_td_scatters, layout=scatter_data["scatters_layout"]["td"])
+        else:
+            fig_cd = go.Figure(data=all_cd_scatters + all_cds_scatters, layout=scatter_data["scatters_layout"]["cd"])
+            fig_td = go.Figure(data=all_td_scatters + all_tds_scatters, layout=scatter_data["scatters_layout"]["td"])
 
-    fig_cd.update_layout(legend=scatter_data["scatters_layout"]["legend"])
-    fig_td.update_layout(legend=scatter_data["scatters_layout"]["legend"])
+        fig_cd.update_layout(legend=scatter_data["scatters_layout"]["legend"])
+        fig_td.update_layout(legend=scatter_data["scatters_layout"]["legend"])
 
-    information_df = calculate_information(scatter_data["total_power"], scatter_data["power_by_experiment"],
-                                           cost_per_kwh, currency, carbon_footprint, carbon_footprint_km)
+        fig_efficiency = make_efficiency_figure(efficiency_by_experiment, autosize)
 
-    return fig_cd, fig_td, information_df
+        graph = {"fig_cd": fig_cd, "fig_td": fig_td, "fig_efficiency": fig_efficiency,
+                 "total_power": scatter_data["total_power"], "power_by_experiment": scatter_data["power_by_experiment"],
+                 "duration_by_experiment": scatter_data["duration_by_experiment"],
+                 "efficiency_by_experiment": efficiency_by_experiment}
+        if not live:
+            cache.set("graphs", graph_key, graph)
+
+    fig_cd, fig_td, fig_efficiency = graph["fig_cd"], graph["fig_td"], graph["fig_efficiency"]
+    information_df = calculate_information(graph["total_power"], graph["power_by_experiment"], cost_per_kwh, currency,
+                                           carbon_footprint, carbon_footprint_km, graph["duration_by_experiment"],
+                                           baseline_by_experiment, graph["efficiency_by_experiment"],
+                                           intensity_by_experiment)
+
+    return fig_cd, fig_td, fig_efficiency, information_df
 
 
 @callback(
     Output(component_id='plot_current_draw', component_property='figure'),
     Output(component_id='plot_total_draw', component_property='figure'),
+    Output(component_id='plot_efficiency', component_property='figure'),
+    Output(component_id='plot_efficiency', component_property='style'),
     Output(component_id='experiment_data', component_property='data'),
     Output(component_id='experiment_data', component_property='columns'),
     Input(component_id='file_dropdown', component_property='value'),
@@ -795,24 +1365,66 @@ def make_graph(files, cost_per_kwh, currency, carbon_footprint, carbon_footprint
     Input(component_id='carbon_footprint', component_property='value'),
     Input(component_id='carbon_footprint_km', component_property='value'),
     Input(component_id='smoothness_input', component_property='value'),
-    Input(component_id='graph_rolling_window_toggle', component_property='value')
+    Input(component_id='graph_rolling_window_toggle', component_property='value'),
+    Input(component_id='region', component_property='value')
 )
 def update_graph(files, n_intervals, cost_per_kwh, currency, carbon_footprint, carbon_footprint_km, smoothness,
-                 smoothness_toggle):
-    invalid_experiment = {}, {}, [], []
+                 smoothness_toggle, region=""):
+    invalid_experiment = {}, {}, {}, {'display': 'none'}, [], []
     try:
-        fig_cd, fig_td, information_df = make_graph(files, cost_per_kwh, currency, carbon_footprint,
-                                                    carbon_footprint_km, smoothness, smoothness_toggle, True)
+        fig_cd, fig_td, fig_efficiency, information_df = make_graph(files, cost_per_kwh, currency, carbon_footprint,
+                                                                    carbon_footprint_km, smoothness,
+                                                                    smoothness_toggle, True, region=region)
     except ValueError:
         return invalid_experiment
 
-    return fig_cd, fig_td, information_df.to_dict('records'), [{"name": i, "id": i} for i in information_df.columns]
+    # The efficiency graph is only shown for experiments that count units of work.
+    efficiency_style = {} if fig_efficiency.data else {'display': 'none'}
+
+    return (fig_cd, fig_td, fig_efficiency, efficiency_style, information_df.to_dict('records'),
+            [{"name": i, "id": i} for i in information_df.columns])
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Run monitoring interface.')
     parser.add_argument('--ip', type=str, required=False, default="127.0.0.1")
     parser.add_argument('--port', type=int, required=False, default=5000)
+    parser.add_argument('--production', action='store_true')
+    parser.add_argument('--workers', type=int, required=False, default=4)
+    parser.add_argument('--threads', type=int, required=False, default=4)
+    parser.add_argument('--cache_dir', type=str, required=False, default=None)
+    parser.add_argument('--no_cache', action='store_true')
+    parser.add_argument('--sqlite_path', type=str, required=False, default=None)
     args = parser.parse_args()
 
-    app.run(debug=True, host=args.ip, port=args.port)
+    if args.sqlite_path is not None:
+        sqlite_path = args.sqlite_path
+
+    if args.cache_dir is not None:
+        cache.folder = Path(args.cache_dir)
+    # The debug server runs a single worker, so the cache is only used in production mode.
+    if args.no_cache or not args.production:
+        cache.enabled = False
+
+    if not args.production:
+        app.run(debug=True, host=args.ip, port=args.port)
+    elif sys.platform != 'win32':
+        from gunicorn.app.base import BaseApplication
+
+        class MonitoringApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set("bind", f"{args.ip}:{args.port}")
+                self.cfg.set("workers", args.workers)
+                self.cfg.set("threads", args.threads)
+
+            def load(self):
+                return server
+
+        print(f"Running monitoring interface with {args.workers} workers at http://{args.ip}:{args.port}")
+        MonitoringApplication().run()
+    else:
+        from waitress import serve
+
+        print(f"Running monitoring interface with {args.workers * args.threads} threads at "
+              f"http://{args.ip}:{args.port}")
+        serve(server, host=args.ip, port=args.port, threads=args.workers * args.threads)
@@ -0,0 +1,104 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from time import time
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Dataclass to store how failed smart plug readings are retried.
+    """
+    max_retries: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 2.0
+    request_timeout: float = 5.0
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+
+    def backoff_delay(self, attempt):
+        """
+        Get the jittered exponential backoff delay before a retry.
+        :param attempt: The number of the retry, starting at 0.
+        :return: The delay in seconds, drawn uniformly between 0 and the exponential backoff.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Class to stop polling a device after repeated failures and to probe it again after a cool down.
+    """
+
+    def __init__(self, threshold, reset_timeout):
+        """
+        Initialize the CircuitBreaker.
+        :param threshold: The number of consecutive failed polls after which the breaker opens.
+        :param reset_timeout: The time in seconds after which an open breaker lets a single probe through.
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        """
+        Check whether the device may be polled.
+        :return: True if the breaker is closed or the cool down of the open breaker has passed.
+        """
+        return self.opened_at is None or self.opened_at + self.reset_timeout <= time()
+
+    def record_success(self):
+        """
+        Close the breaker after a successful poll.
+        """
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        """
+        Count a failed poll and open the breaker once the threshold is reached.
+        :return: True if the breaker opened with this failure.
+        """
+        self.failures += 1
+        if self.failures >= self.threshold:
+            was_open = self.opened_at is not None
+            self.opened_at = time()
+            return not was_open
+        return False
+
+
+class PollFailed(Exception):
+    """
+    Exception raised when a smart plug reading failed after all retries.
+    """
+    pass
+
+
+async def poll_with_retries(api, device, policy, on_retry=None, on_error=None):
+    """
+    Read a smart plug with a timeout per request and jittered exponential backoff between retries.
+    :param api: The asynchronous meter function to call.
+    :param device: The keyword arguments of the meter function. "request_timeout" defaults to the timeout of the
+    policy.
+    :param policy: The RetryPolicy to apply.
+    :param on_retry: Optional function called before each retry.
+    :param on_error: Optional function called with each exception that is raised by a request.
+    :return: The MeasurementLogResult of the first successful request.
+    """
+    # Drivers with blocking requests, e.g., Shelly, time out their requests themselves with the same timeout.
+    device = {"request_timeout": policy.request_timeout, **device}
+    for attempt in range(policy.max_retries + 1):
+        if attempt > 0:
+            if on_retry is not None:
+                on_retry()
+            await asyncio.sleep(policy.backoff_delay(attempt - 1))
+        try:
+            return await asyncio.wait_for(api(**device), timeout=policy.request_timeout)
+        except Exception as e:
+            if on_error is not None:
+                on_error(e)
+            last_error = e
+
+    raise PollFailed(f"Reading failed after {policy.max_retries + 1} attempts: "
+                     f"{type(last_error).__name__}: {last_error}")